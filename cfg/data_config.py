@@ -0,0 +1,21 @@
+# Schema of the long-format table built at ingest
+
+# Storage dtype of the measure columns ('float64', or 'float32' to halve their memory)
+measure_dtype = 'float64'
+
+# JSON backend for reading logs: 'auto' uses the first installed of msgspec, simdjson
+# and orjson, falling back to the standard library ('json')
+json_decoder = 'auto'
+
+# Trajectory ingestion (data_analysis.py --trajectories): where the per-sample arrays are
+# stored in each log. 'key' holds either a list of samples ({'t': .., 'x': .., ...}) or a
+# dict of equal-length arrays. Path error is the distance between the position and the
+# reference columns; logs are converted to arrays chunk_samples samples at a time.
+trajectory_config = {
+    'key': 'trajectory',
+    'time': 't',
+    'position': ['x', 'y', 'z'],
+    'reference': ['ref_x', 'ref_y', 'ref_z'],
+    'percentiles': [50, 95],
+    'chunk_samples': 65536
+}
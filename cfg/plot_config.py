@@ -1,6 +1,10 @@
 # Universal configuration for plotting
 palette = 'Set2'
 
+# Output format ('png', 'svg' or 'jpeg') and resolution of saved figures
+figure_format = 'jpeg'
+figure_dpi = 600
+
 # Condition remapping
 condition_mapping = {
         '0': 'Baseline',
@@ -20,7 +24,9 @@ boxplot_config_time = {
     'y_label': 'Condition',
     'palette': palette,
     'y_lim': None,
-    'condition_labels': condition_mapping
+    'condition_labels': condition_mapping,
+    'format': figure_format,
+    'dpi': figure_dpi
 }
 boxplot_config_error = {
     'title': 'Path following MSE by Condition',
@@ -28,7 +34,9 @@ boxplot_config_error = {
     'y_label': 'Condition',
     'palette': palette,
     'y_lim': None,
-    'condition_labels': condition_mapping
+    'condition_labels': condition_mapping,
+    'format': figure_format,
+    'dpi': figure_dpi
 }
 
 learning_curve_config_time = {
@@ -37,7 +45,9 @@ learning_curve_config_time = {
     'y_label': 'time (s)',
     'palette': palette,
     'invert_yaxis': False,
-    'condition_labels': condition_mapping
+    'condition_labels': condition_mapping,
+    'format': figure_format,
+    'dpi': figure_dpi
 }
 
 learning_curve_config_error = {
@@ -46,5 +56,21 @@ learning_curve_config_error = {
     'y_label': 'mse (m^2)',
     'palette': palette,
     'invert_yaxis': False,
-    'condition_labels': condition_mapping
+    'condition_labels': condition_mapping,
+    'format': figure_format,
+    'dpi': figure_dpi
+}
+
+qq_plot_config = {
+    'format': 'png',
+    'dpi': 100
+}
+
+# Titles and axis labels of the measures derived from trajectories (data_analysis.py --trajectories)
+trajectory_measure_labels = {
+    'traj_mse': ('Trajectory MSE', 'mse (m^2)'),
+    'traj_rmse': ('Trajectory RMSE', 'rmse (m)'),
+    'traj_jerk': ('Mean Jerk', 'jerk (m/s^3)'),
+    'traj_p50': ('Median Path Error', 'path error (m)'),
+    'traj_p95': ('95th Percentile Path Error', 'path error (m)')
 }
@@ -0,0 +1,99 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from data_analysis import run_analysis, collect_results, add_analysis_arguments, config_from_args
+from utils import results_sink, worker_pool, packed_dataset
+
+# This script runs the analysis of data_analysis.py on many data directories (study
+# variants, sensitivity subsets, ...) in one interpreter. Libraries are imported once
+# and every parallel step of every study submits to one shared process pool. Several
+# studies run at the same time (--parallel-studies). Each directory gets its usual
+# results/ and plots/; a combined summary (batch_summary.xlsx by default) stacks the
+# result tables of all studies with a 'Study' column, after a 'Studies' overview sheet.
+
+def expand_directories(patterns):
+    # Arguments may be directories or glob patterns (quoted, so the shell leaves them alone)
+    directories = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if not os.path.isdir(path):
+                continue
+            if os.path.isdir(os.path.join(path, 'json_logs')) or packed_dataset.find_packed(path):
+                directories.append(os.path.normpath(path))
+            elif not glob.has_magic(pattern):
+                print(f"Warning: {path} has neither json_logs/ nor a packed dataset, skipping it")
+    # Each directory once, in the order given
+    return list(dict.fromkeys(directories))
+
+def study_names(directories):
+    # Paths relative to the common parent; the directory name alone for a single study
+    if len(directories) == 1:
+        return [os.path.basename(os.path.abspath(directories[0]))]
+    parent = os.path.commonpath([os.path.abspath(d) for d in directories])
+    return [os.path.relpath(os.path.abspath(d), parent) for d in directories]
+
+def default_output_dir(directories):
+    parent = os.path.commonpath([os.path.abspath(d) for d in directories])
+    return os.path.dirname(parent) if len(directories) == 1 else parent
+
+def analyse_study(study, data_dir, config):
+    # One study; a failure is recorded in the overview instead of stopping the batch
+    start = time.perf_counter()
+    record = {'Study': study, 'Directory': os.path.abspath(data_dir), 'Status': 'ok', 'Error': None,
+              'Participants': None, 'Rows': None, 'Seconds': None, 'Results': None}
+    sheets = []
+    try:
+        values = run_analysis(data_dir, config, label=study)
+        df_long = values['df_long']
+        record['Participants'] = df_long['participantID'].nunique()
+        record['Rows'] = len(df_long)
+        record['Results'] = values.get('results_path')
+        if all(name in values for name in ('repeated_measures', 'normality', 'learning_curves', 'annotation_index')):
+            results_dict = collect_results(values['repeated_measures'], values['normality'], values['learning_curves'], values['annotation_index'], values['measures'])
+            sheets = results_sink.collect_result_sheets(results_dict)
+    except Exception as e:
+        print(f"Warning: analysis of {data_dir} failed: {e!r}")
+        traceback.print_exc()
+        record['Status'] = 'failed'
+        record['Error'] = repr(e)
+    record['Seconds'] = round(time.perf_counter() - start, 2)
+    print(f"[batch] {study}: {record['Status']} in {record['Seconds']:.2f} s")
+    return record, sheets
+
+def run_batch(directories, config, output_dir, sink='xlsx', parallel_studies=2):
+    names = study_names(directories)
+    # Figures of a study are drawn in its own thread when workers == 1, and pyplot is not
+    # thread-safe, so studies then run one after another
+    parallel_studies = 1 if config.get('workers') == 1 else max(1, parallel_studies)
+    with worker_pool.shared_pool(config.get('workers')):
+        with ThreadPoolExecutor(max_workers=parallel_studies) as executor:
+            outcomes = list(executor.map(analyse_study, names, directories, [config] * len(directories)))
+    overview = pd.DataFrame([record for record, _ in outcomes])
+    combined = results_sink.combine_result_sheets([(name, sheets) for name, (_, sheets) in zip(names, outcomes)])
+    summary_path = results_sink.write_sheets([('Studies', overview), *combined], output_dir, 'batch_summary', sink=sink)
+    return overview, summary_path
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("directories", nargs='+', help="Data directories or glob patterns (e.g. 'studies/*')")
+    arg_parser.add_argument("-o", "--output", default=None, help="Directory for the combined summary (default: the common parent of the data directories)")
+    arg_parser.add_argument("-j", "--parallel-studies", type=int, default=2, help="Number of studies analysed at the same time")
+    add_analysis_arguments(arg_parser)
+    args = arg_parser.parse_args()
+
+    directories = expand_directories(args.directories)
+    if not directories:
+        arg_parser.error("no data directories found")
+    print(f"Analysing {len(directories)} studies")
+    output_dir = args.output or default_output_dir(directories)
+    overview, summary_path = run_batch(directories, config_from_args(args), output_dir, sink=args.results_format, parallel_studies=args.parallel_studies)
+    print(overview[['Study', 'Status', 'Participants', 'Rows', 'Seconds']].to_string(index=False))
+    print(f"Combined summary saved to {summary_path}")
+    if (overview['Status'] != 'ok').any():
+        sys.exit(1)
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+from utils import parse_core, log_decoder
+
+# This script measures the decode throughput (MB/s) of each installed JSON backend in
+# utils/log_decoder.py against the previous path (stdlib json.loads of the whole
+# document) on synthetic logs carrying per-sample trajectories, and checks that every
+# backend yields the same rows and integrity issues.
+
+def make_log(rng, pid, mode, samples):
+    samples_t = np.cumsum(rng.uniform(0.005, 0.015, samples))
+    trajectory = [
+        {"t": round(float(t), 6), "x": round(float(x), 6), "y": round(float(y), 6), "z": round(float(z), 6)}
+        for t, (x, y, z) in zip(samples_t, rng.normal(size=(samples, 3)))
+    ]
+    round_data = {"id": f"{pid:02d}", "mode": mode, "t": round(float(rng.uniform(100, 200)), 6), "mse": round(float(rng.uniform(500, 1500)), 6)}
+    return {"round_data": round_data, "trajectory": trajectory}
+
+def make_logs(n_files, samples, seed=0):
+    # [(file name, raw bytes)]; a few files are truncated or lack mse so the error paths are exercised
+    rng = np.random.default_rng(seed)
+    logs = []
+    for i in range(n_files):
+        pid, mode = i // 3 + 1, i % 3
+        data = make_log(rng, pid, mode, samples)
+        if i % 50 == 7:
+            del data["round_data"]["mse"]
+        raw = json.dumps(data).encode()
+        if i % 50 == 23:
+            raw = raw[:len(raw) // 2]
+        logs.append((f"{pid:02d}_{mode}_20250101.json", raw))
+    return logs
+
+def legacy_decode(raw):
+    return json.loads(raw).get('round_data', {})
+
+def run_backend(decode, logs):
+    start = time.perf_counter()
+    results = []
+    for fname, raw in logs:
+        try:
+            round_data = log_decoder.decode_round_data(raw, decode)
+            results.append(parse_core.parse_round_data(round_data))
+        except Exception as e:
+            results.append(type(e).__name__)
+    return time.perf_counter() - start, results
+
+def same_results(a, b):
+    # NaN-aware comparison of parsed rows
+    return len(a) == len(b) and all(
+        x == y or (isinstance(x, tuple) and isinstance(y, tuple) and x[:2] == y[:2]
+                   and all(u == v or (u != u and v != v) for u, v in zip(x[2:], y[2:])))
+        for x, y in zip(a, b)
+    )
+
+def time_files(logs, workers):
+    # End to end: bytes read from disk and inspected with the configured backend
+    with tempfile.TemporaryDirectory() as data_dir:
+        json_dir = os.path.join(data_dir, 'json_logs')
+        os.makedirs(json_dir)
+        for i, (fname, raw) in enumerate(logs):
+            with open(os.path.join(json_dir, f"{i:06d}_{fname}"), 'wb') as f:
+                f.write(raw)
+        start = time.perf_counter()
+        parse_core.scan_logs(data_dir, workers=workers, use_cache=False)
+        return time.perf_counter() - start
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--files", type=int, default=300, help="Number of synthetic log files")
+    arg_parser.add_argument("--samples", type=int, nargs='+', default=[0, 1000, 10000], help="Trajectory samples per log")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Best of this many timings")
+    arg_parser.add_argument("-w", "--workers", type=int, default=1, help="Workers for the end-to-end scan")
+    args = arg_parser.parse_args()
+
+    backends = {'json (previous)': legacy_decode}
+    for name in log_decoder.PREFERENCE:
+        try:
+            backends[name] = log_decoder.load_decoder(name)[1]
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+    print(f"Configured backend: {log_decoder.active_decoder()[0]}")
+
+    print(f"{'samples':>8} {'MB':>8} {'backend':<16} {'seconds':>9} {'MB/s':>9} {'speedup':>8}")
+    for samples in args.samples:
+        logs = make_logs(args.files, samples)
+        megabytes = sum(len(raw) for _, raw in logs) / 2**20
+        reference = None
+        for name, decode in backends.items():
+            seconds, results = min((run_backend(decode, logs) for _ in range(args.repeat)), key=lambda r: r[0])
+            if reference is None:
+                reference = (seconds, results)
+            elif not same_results(results, reference[1]):
+                raise AssertionError(f"{name} decoded different rows than the stdlib decoder")
+            print(f"{samples:>8} {megabytes:>8.1f} {name:<16} {seconds:>9.3f} {megabytes / seconds:>9.1f} {reference[0] / seconds:>7.1f}x")
+        seconds = time_files(logs, args.workers)
+        print(f"{samples:>8} {megabytes:>8.1f} {'scan_logs':<16} {seconds:>9.3f} {megabytes / seconds:>9.1f} {'-':>8}")
@@ -0,0 +1,87 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+# This script measures the cold-start import cost of each entry point with
+# `python -X importtime` and can compare it against a saved baseline.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    'src/data_analysis.py': [os.path.join('src', 'data_analysis.py'), '--help'],
+    'src/check_data.py': ['-c', 'import src.check_data'],
+    'utils/parse_core.py': ['-c', 'import utils.parse_core'],
+}
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def measure_entry_point(args):
+    # -X importtime writes one line per imported module to stderr
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    modules = {}
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        modules[name] = int(cumulative_us)
+        # Top-level imports (single space of indentation) add up to the total
+        if len(indent) == 1:
+            total_us += int(cumulative_us)
+    return total_us, modules
+
+def run_benchmark(repeats=3, top=5):
+    report = {}
+    for label, args in ENTRY_POINTS.items():
+        # Keep the fastest run to reduce noise from the file system cache
+        runs = [measure_entry_point(args) for _ in range(repeats)]
+        total_us, modules = min(runs, key=lambda run: run[0])
+        heaviest = sorted(((n, us) for n, us in modules.items() if '.' not in n), key=lambda item: -item[1])[:top]
+        report[label] = {
+            'total_ms': round(total_us / 1000, 1),
+            'heaviest_packages_ms': {name: round(us / 1000, 1) for name, us in heaviest}
+        }
+    return report
+
+def compare_to_baseline(report, baseline, tolerance):
+    regressions = []
+    for label, entry in report.items():
+        if label not in baseline:
+            continue
+        limit = baseline[label]['total_ms'] * (1 + tolerance)
+        if entry['total_ms'] > limit:
+            regressions.append(f"{label}: {entry['total_ms']} ms > {limit:.1f} ms (baseline {baseline[label]['total_ms']} ms)")
+    return regressions
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--repeats", type=int, default=3, help="Runs per entry point, the fastest one is reported")
+    arg_parser.add_argument("--save", default=None, help="Write the report as JSON to this path")
+    arg_parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown versus the baseline")
+    args = arg_parser.parse_args()
+
+    report = run_benchmark(repeats=args.repeats)
+    for label, entry in report.items():
+        heaviest = ', '.join(f"{name} {ms} ms" for name, ms in entry['heaviest_packages_ms'].items())
+        print(f"{label:<24} {entry['total_ms']:>8.1f} ms  ({heaviest})")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Import time regression: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+from contextlib import nullcontext
+from utils import statistical_tools, plot_essentials, render_queue, parse_core, pipeline
+from cfg import plot_config
+
+# This script reports the peak RSS of the df_long hand-offs in src/data_analysis.py,
+# once with defensive df_long.copy() calls like the ones the stages used to make
+# ("copies") and once with the shared copy-on-write table ("shared"). Each mode runs
+# in a fresh child process. It is not a before/after measurement of the whole pipeline:
+# both modes run the current code, the copies are re-created here, and the residual OLS
+# and the mixed models are left out, since their design matrices grow with the number
+# of participants and are not feasible at a million rows.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MEASURES = ['time', 'error']
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def current_rss_mb():
+    # Resident set size right now (Linux /proc), as opposed to the high-water mark
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+def make_long_table(n_rows, seed=0):
+    # One row per participant and condition, in the compact ingest schema
+    rng = np.random.default_rng(seed)
+    n_participants = -(-n_rows // 3)
+    pids = [f"{pid:06d}" for pid in range(n_participants)]
+    trials = np.argsort(rng.random((n_participants, 3)), axis=1).ravel()
+    df_long = pd.DataFrame({
+        'participantID': pd.Categorical(np.repeat(pids, 3), categories=pids, ordered=True),
+        'condition': pd.Categorical(np.tile(['0', '1', '2'], n_participants), categories=['0', '1', '2'], ordered=True),
+        'time': rng.uniform(100, 200, 3 * n_participants),
+        'error': rng.uniform(500, 1500, 3 * n_participants)
+    })
+    df_long['trialID'] = pd.Categorical.from_codes(trials, categories=parse_core.TRIAL_IDS, ordered=True)
+    return df_long.iloc[:n_rows]
+
+def run_stages(df_long, data_dir, copy_inputs):
+    # Same calls as the normality, repeated_measures and plots stages
+    share = (lambda df: df.copy()) if copy_inputs else (lambda df: df)
+    figures = []
+    for measure in MEASURES:
+        statistical_tools.check_normality_condition(share(df_long), measure, alpha=0.05, data_dir=data_dir, figure_queue=figures)
+    statistical_tools.compute_repeated_measures_batch(df_long, MEASURES)
+    for measure in MEASURES:
+        figures.append(render_queue.figure_spec(plot_essentials.boxplot, share(df_long), measure, plot_config.boxplot_config_time, data_dir))
+        figures.append(render_queue.figure_spec(plot_essentials.plot_learning_curve, share(df_long), measure, data_dir, plot_config.learning_curve_config_time))
+    # Figure specs are hashed before rendering, while all of them are alive
+    [render_queue.spec_hash(spec) for spec in figures]
+    return current_rss_mb()
+
+def run_child(mode, n_rows):
+    df_long = make_long_table(n_rows)
+    table_mb = df_long.memory_usage(deep=True).sum() / 2**20
+    baseline_mb = peak_rss_mb()
+    # The shared mode runs under the same copy-on-write scope as pipeline.run_pipeline
+    with tempfile.TemporaryDirectory() as data_dir, (pipeline.copy_on_write() if mode == 'shared' else nullcontext()):
+        render_rss_mb = run_stages(df_long, data_dir, copy_inputs=(mode == 'copies'))
+    print(json.dumps({
+        'table_mb': round(table_mb, 1),
+        'baseline_rss_mb': round(baseline_mb, 1),
+        'rss_at_render_mb': round(render_rss_mb, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }))
+
+def run_mode(mode, n_rows):
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', mode, '--rows', str(n_rows)],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--rows", type=int, default=1_000_000, help="Rows in the synthetic long table")
+    arg_parser.add_argument("--child", choices=['copies', 'shared'], default=None, help=argparse.SUPPRESS)
+    arg_parser.add_argument("--save", default=None, help="Write the report as JSON to this path")
+    args = arg_parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.rows)
+        sys.exit(0)
+
+    report = {'rows': args.rows}
+    print(f"{'mode':>8} {'table (MB)':>11} {'baseline RSS (MB)':>18} {'RSS at render (MB)':>19} {'peak RSS (MB)':>14}")
+    for mode in ['copies', 'shared']:
+        report[mode] = run_mode(mode, args.rows)
+        r = report[mode]
+        print(f"{mode:>8} {r['table_mb']:>11} {r['baseline_rss_mb']:>18} {r['rss_at_render_mb']:>19} {r['peak_rss_mb']:>14}")
+    print(f"Peak RSS saved: {report['copies']['peak_rss_mb'] - report['shared']['peak_rss_mb']:.1f} MB")
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
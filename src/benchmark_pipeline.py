@@ -0,0 +1,158 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from importlib import metadata
+from generate_fake_data import generate_dataset
+
+# This script generates synthetic datasets of increasing size and times the
+# data_analysis.py pipeline on each: a cold run (cache directory removed), a
+# warm rerun, and every stage on its own in a fresh process to record its peak
+# RSS. The JSON report can be saved and passed back with --baseline to flag
+# slowdowns.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANALYSIS_SCRIPT = os.path.join(REPO_ROOT, 'src', 'data_analysis.py')
+STAGE_LINE = re.compile(r'\[pipeline\] (\w+): (?:done in ([\d.]+) s|reused cached result)')
+STAGES = ['parse', 'normality', 'repeated_measures', 'learning_curve', 'annotations', 'export', 'plots']
+PACKAGES = ['numpy', 'pandas', 'scipy', 'statsmodels', 'pingouin', 'matplotlib', 'seaborn']
+
+def run_analysis(data_dir, *args):
+    # Returns wall time, peak RSS of the child process and the per-stage times it printed
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, ANALYSIS_SCRIPT, '-d', data_dir, *args],
+        cwd=REPO_ROOT, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    output = proc.stdout.read()
+    # wait4 reports the resource usage of this child alone (ru_maxrss in kilobytes on Linux)
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"data_analysis.py {' '.join(args)} failed with exit code {proc.returncode}:\n{output[-2000:]}")
+    stages = {}
+    for match in STAGE_LINE.finditer(output):
+        stages[match.group(1)] = float(match.group(2)) if match.group(2) else 0.0
+    return {
+        'seconds': round(time.perf_counter() - start, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'stages': stages
+    }
+
+def clear_cache(data_dir, *parts):
+    # All of data_dir/cache/, or only the given subdirectory of it
+    shutil.rmtree(os.path.join(data_dir, 'cache', *parts), ignore_errors=True)
+
+def benchmark_size(data_dir, n_participants, config):
+    start = time.perf_counter()
+    summary = generate_dataset(data_dir, n_participants=n_participants, **config)
+    entry = {
+        'files': summary['files'],
+        'corrupted': len(summary['corrupted']),
+        'generate_s': round(time.perf_counter() - start, 3)
+    }
+    # Caches left by an earlier run (e.g. with --keep) would make the cold run warm
+    clear_cache(data_dir)
+    entry['cold'] = run_analysis(data_dir, '--no-cache', '--force', 'all')
+    entry['warm'] = run_analysis(data_dir)
+    # Each stage recomputed alone; upstream stages come from the memo (parse always runs).
+    # The caches inside a stage (ingest, mixed models) are bypassed so that real work is timed
+    entry['stages'] = {}
+    for stage in STAGES:
+        clear_cache(data_dir, 'mixedlm')
+        extra = ['--no-cache'] if stage == 'parse' else []
+        run = run_analysis(data_dir, '--only', stage, '--force', stage, '--force-plots', *extra)
+        entry['stages'][stage] = {'seconds': run['stages'].get(stage), 'peak_rss_mb': run['peak_rss_mb']}
+    return entry
+
+def environment_info():
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit or None,
+        'packages': versions
+    }
+
+def compare_to_baseline(report, baseline, tolerance):
+    regressions = []
+    for size, entry in report['sizes'].items():
+        if size not in baseline.get('sizes', {}):
+            continue
+        base = baseline['sizes'][size]
+        checks = [('cold run', entry['cold']['seconds'], base['cold']['seconds'])]
+        checks += [
+            (f"{stage} stage", stats['seconds'], base['stages'].get(stage, {}).get('seconds'))
+            for stage, stats in entry['stages'].items()
+        ]
+        for label, value, reference in checks:
+            if value is None or not reference:
+                continue
+            limit = reference * (1 + tolerance)
+            if value > limit:
+                regressions.append(f"{size} participants, {label}: {value:.2f} s > {limit:.2f} s (baseline {reference:.2f} s)")
+    return regressions
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("-p", "--participants", type=int, nargs='+', default=[50, 200], help="Dataset sizes (number of participants) to benchmark")
+    arg_parser.add_argument("--rounds", type=int, default=1, help="Rounds stored in each log file")
+    arg_parser.add_argument("--extra-metrics", type=int, default=0, help="Additional metric values per round")
+    arg_parser.add_argument("--corrupt-fraction", type=float, default=0.0, help="Fraction of corrupted log files")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Random seed for the datasets")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes for data generation")
+    arg_parser.add_argument("--keep", default=None, help="Generate the datasets under this directory and keep them")
+    arg_parser.add_argument("--save", default=None, help="Write the report as JSON to this path")
+    arg_parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown versus the baseline")
+    args = arg_parser.parse_args()
+
+    config = {
+        'rounds_per_file': args.rounds,
+        'extra_metrics': args.extra_metrics,
+        'corrupt_fraction': args.corrupt_fraction,
+        'seed': args.seed,
+        'workers': args.workers
+    }
+    report = {'environment': environment_info(), 'config': {k: v for k, v in config.items() if k != 'workers'}, 'sizes': {}}
+    root = args.keep or tempfile.mkdtemp()
+    try:
+        for n_participants in args.participants:
+            data_dir = os.path.join(root, f'participants_{n_participants}')
+            shutil.rmtree(data_dir, ignore_errors=True)
+            entry = benchmark_size(data_dir, n_participants, config)
+            report['sizes'][str(n_participants)] = entry
+            print(f"{n_participants} participants ({entry['files']} files): cold {entry['cold']['seconds']:.2f} s, "
+                  f"warm {entry['warm']['seconds']:.2f} s, peak RSS {entry['cold']['peak_rss_mb']} MB")
+            for stage, stats in entry['stages'].items():
+                seconds = f"{stats['seconds']:.2f} s" if stats['seconds'] is not None else '-'
+                print(f"    {stage:<18} {seconds:>9} {stats['peak_rss_mb']:>9} MB")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Pipeline regression: {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,77 @@
+import os
+import time
+import argparse
+import tempfile
+import itertools
+import numpy as np
+import pandas as pd
+from utils import parse_core
+
+# This script benchmarks parse_core.attach_trial_id against the previous
+# iterrows-based implementation on synthetic long tables.
+
+def legacy_attach_trial_id(data_dir, df_long):
+    order_path = os.path.join(data_dir, 'other', 'order.xlsx')
+    order_df = pd.read_excel(order_path, skiprows=1)
+    order_df['participantID'] = order_df['participantID'].apply(lambda x: str(x).zfill(2))
+    df_long['participantID'] = df_long['participantID'].apply(lambda x: str(x).zfill(2))
+    order_map = {}
+    for _, row in order_df.iterrows():
+        mode_to_trial = {}
+        for i, cond_col in enumerate(['condA', 'condB', 'condC'], 1):
+            val = row[cond_col]
+            if pd.notna(val):
+                mode_to_trial[str(int(val))] = i
+        order_map[str(row['participantID'])] = mode_to_trial
+    trial_id_list = []
+    for _, row in df_long.iterrows():
+        try:
+            cond = str(int(float(row['condition'])))
+        except Exception:
+            cond = str(row['condition'])
+        trial_id_list.append(order_map.get(str(row['participantID']), {}).get(cond, None))
+    df_long['trialID'] = pd.Series(trial_id_list, dtype="Int64")
+    return df_long
+
+def make_dataset(data_dir, n_rows, n_participants, seed=0):
+    rng = np.random.default_rng(seed)
+    perms = list(itertools.permutations([0, 1, 2]))
+    order_df = pd.DataFrame(
+        [[pid, *perms[rng.integers(len(perms))]] for pid in range(1, n_participants + 1)],
+        columns=['participantID', 'condA', 'condB', 'condC']
+    )
+    os.makedirs(os.path.join(data_dir, 'other'), exist_ok=True)
+    with pd.ExcelWriter(os.path.join(data_dir, 'other', 'order.xlsx')) as writer:
+        order_df.to_excel(writer, index=False, startrow=1)
+    pids = rng.integers(1, n_participants + 1, n_rows)
+    df_long = pd.DataFrame({
+        'participantID': pd.Categorical([f"{pid:02d}" for pid in pids]),
+        'condition': pd.Categorical(rng.integers(0, 3, n_rows).astype(str)),
+        'time': rng.uniform(100, 200, n_rows),
+        'error': rng.uniform(500, 1500, n_rows)
+    })
+    return df_long
+
+def time_call(func, data_dir, df_long):
+    start = time.perf_counter()
+    result = func(data_dir, df_long.copy())
+    return time.perf_counter() - start, result
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--sizes", type=int, nargs='+', default=[10_000, 100_000, 1_000_000], help="Row counts to benchmark")
+    arg_parser.add_argument("--participants", type=int, default=200, help="Number of participants in the order file")
+    arg_parser.add_argument("--legacy-max-rows", type=int, default=1_000_000, help="Skip the legacy implementation above this many rows")
+    args = arg_parser.parse_args()
+
+    print(f"{'rows':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    with tempfile.TemporaryDirectory() as data_dir:
+        for n_rows in args.sizes:
+            df_long = make_dataset(data_dir, n_rows, args.participants)
+            new_time, new_result = time_call(parse_core.attach_trial_id, data_dir, df_long)
+            if n_rows <= args.legacy_max_rows:
+                old_time, old_result = time_call(legacy_attach_trial_id, data_dir, df_long)
+                pd.testing.assert_series_equal(new_result['trialID'].astype('Int64'), old_result['trialID'])
+                print(f"{n_rows:>10} {old_time:>12.3f} {new_time:>15.3f} {old_time / new_time:>8.1f}x")
+            else:
+                print(f"{n_rows:>10} {'skipped':>12} {new_time:>15.3f} {'-':>9}")
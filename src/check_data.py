@@ -1,68 +1,49 @@
 import os
-import json
-import re
+import argparse
+import pandas as pd
+from utils import parse_core
+from utils.cache_utils import atomic_path
 
 # This script checks the integrity of JSON files in a specified directory.
+# Validation and ingestion share a single pass over the logs (parse_core.validate_and_parse),
+# so each file is read exactly once. Every .json log is checked, including the ones with
+# 'trial' in their name that the analysis leaves out.
 
-def check_json_data_integrity(data_dir):
-    json_dir = os.path.join(data_dir, 'json_logs')
-    pattern = re.compile(r'(\d+)_([0-2])_.*\.json$')
-    issues_found = False
-    participant_files = {}
+def write_report(report, report_path):
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with atomic_path(report_path) as tmp_path, open(tmp_path, 'w') as f:
+        f.write(parse_core.validation_report_to_json(report))
 
-    for fname in os.listdir(json_dir):
-        if not fname.endswith('.json'):
-            continue
-        match = pattern.match(fname)
-        if not match:
-            print(f"Filename format issue: {fname}")
-            issues_found = True
-            continue
-        file_pid, file_mode = match.group(1), match.group(2)
-        participant_files.setdefault(file_pid, set()).add(file_mode)
-        fpath = os.path.join(json_dir, fname)
-        with open(fpath, 'r') as f:
-            try:
-                data = json.load(f)
-                round_data = data.get('round_data', {})
-                rd_pid = str(round_data.get('id', ''))
-                rd_mode = str(round_data.get('mode', ''))
-                t_val = round_data.get('t', None)
-                mse_val = round_data.get('mse', None)
+def check_json_data_integrity(data_dir, workers=None, fail_fast=False, report_path=None):
+    try:
+        _, report = parse_core.validate_and_parse(data_dir, workers=workers, fail_fast=fail_fast, attach_trial=False, include_trial_logs=True)
+    except parse_core.IntegrityIssue as e:
+        # Only a --fail-fast scan raises this; the partial report holds the issue it stopped at
+        print(f"Integrity check stopped at first issue: {e}")
+        if report_path:
+            partial = {
+                'issues': pd.DataFrame([e.record], columns=parse_core.ISSUE_COLUMNS),
+                'files_checked': None,
+                'valid_participants': None
+            }
+            write_report(partial, report_path)
+        return 0
 
-                if file_pid != rd_pid or file_mode != str(rd_mode):
-                    print(f"ID/mode mismatch in {fname}: filename ({file_pid}, {file_mode}) vs round_data ({rd_pid}, {rd_mode})")
-                    issues_found = True
-                if t_val is None:
-                    print(f"Missing 't' in round_data for {fname}")
-                    issues_found = True
-                if mse_val is None:
-                    print(f"Missing 'mse' in round_data for {fname}")
-                    issues_found = True
-            except Exception as e:
-                print(f"Error reading {fname}: {e}")
-                issues_found = True
-
-    all_modes = {'0', '1', '2'}
-    valid_participants = 0
-    for pid, modes in participant_files.items():
-        missing = all_modes - modes
-        extra = modes - all_modes
-        if len(modes) == 3 and not missing and not extra:
-            valid_participants += 1
-        else:
-            print(f"Participant {pid} has files for modes: {sorted(modes)}")
-            if missing:
-                print(f"  Missing modes: {sorted(missing)}")
-            if extra:
-                print(f"  Extra/invalid modes: {sorted(extra)}")
-            issues_found = True
-
-    if not issues_found:
+    for message in report['issues']['message']:
+        print(message)
+    if report['issues'].empty:
         print("All JSON files passed integrity checks.")
-    print(f"Number of valid participants with all 3 modes: {valid_participants}")
-    return valid_participants
+    print(f"Number of valid participants with all 3 modes: {report['valid_participants']}")
+
+    if report_path:
+        write_report(report, report_path)
+    return report['valid_participants']
 
 if __name__ == "__main__":
-    data_directory = "./data"
-    check_json_data_integrity(data_directory)
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("-d", "--directory", default="./data", help="Main data directory")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="Number of parallel workers (1 disables parallelism)")
+    arg_parser.add_argument("--fail-fast", action="store_true", help="Stop at the first issue found")
+    arg_parser.add_argument("--report", default=None, help="Write the issue report as JSON to this path")
+    args = arg_parser.parse_args()
+    check_json_data_integrity(args.directory, workers=args.workers, fail_fast=args.fail_fast, report_path=args.report)
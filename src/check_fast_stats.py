@@ -0,0 +1,80 @@
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from utils import parse_core, statistical_tools, fast_stats
+from src.generate_fake_data import generate_fake_json_files
+
+# This script checks that the NumPy fast path (utils/fast_stats.py) agrees with
+# pingouin on fake data from generate_fake_data.py, and times both on a batch
+# of resampled datasets.
+
+def make_fake_long_table(n_participants, seed):
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate_fake_json_files(f"{data_dir}/json_logs", n_participants=n_participants, n_modes=3)
+        df_long, _ = parse_core.validate_and_parse(data_dir, workers=1, use_cache=False, attach_trial=False)
+    # Rounded copies add ties and zero differences, which take the approximate Wilcoxon path
+    rng = np.random.default_rng(seed)
+    df_long['time_rounded'] = (df_long['time'] / 25).round()
+    df_long['score'] = rng.integers(0, 4, len(df_long)).astype(float)
+    return df_long
+
+def compare_tables(df_long, measures, rtol):
+    fast = statistical_tools.compute_repeated_measures_batch(df_long, measures)
+    mismatches = []
+    for measure in measures:
+        reference = statistical_tools.compute_repeated_measures(df_long, measure)
+        for key in ['stat_analysis', 'results', 'group_stats']:
+            try:
+                pd.testing.assert_frame_equal(reference[key], fast[measure][key], check_dtype=False, rtol=rtol)
+            except AssertionError as e:
+                mismatches.append(f"{measure}/{key}: {e}")
+    return mismatches
+
+def time_resamples(df_long, measure, n_resamples, seed):
+    # Shuffle condition labels within each participant and test every resample
+    X, _, _ = statistical_tools.pivot_measures(df_long, [measure])
+    X = X[:, :, 0]
+    rng = np.random.default_rng(seed)
+    batch = rng.permuted(np.broadcast_to(X, (n_resamples,) + X.shape), axis=-1)
+
+    start = time.perf_counter()
+    fast_stats.friedman(batch)
+    fast_stats.pairwise_wilcoxon(batch)
+    fast_time = time.perf_counter() - start
+
+    n_reference = min(n_resamples, 50)
+    participants = [f"{i:02d}" for i in range(X.shape[0])]
+    start = time.perf_counter()
+    for b in range(n_reference):
+        resample = pd.DataFrame(batch[b], index=participants, columns=['0', '1', '2'])
+        resample = resample.rename_axis('participantID').reset_index().melt(id_vars='participantID', var_name='condition', value_name=measure)
+        statistical_tools.compute_repeated_measures(resample, measure)
+    reference_time = (time.perf_counter() - start) * n_resamples / n_reference
+    return fast_time, reference_time
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--participants", type=int, nargs='+', default=[8, 20, 60], help="Fake dataset sizes to compare")
+    arg_parser.add_argument("--resamples", type=int, default=2000, help="Batch size for the timing comparison")
+    arg_parser.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance for agreement")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    measures = ['time', 'error', 'time_rounded', 'score']
+    failed = False
+    for n_participants in args.participants:
+        df_long = make_fake_long_table(n_participants, args.seed)
+        mismatches = compare_tables(df_long, measures, args.rtol)
+        status = 'agree' if not mismatches else f"{len(mismatches)} mismatches"
+        print(f"{n_participants} participants, measures {measures}: {status}")
+        for mismatch in mismatches:
+            print(f"  {mismatch}")
+        failed = failed or bool(mismatches)
+
+    fast_time, reference_time = time_resamples(df_long, 'time', args.resamples, args.seed)
+    print(f"{args.resamples} resamples: fast path {fast_time:.3f} s, pingouin (extrapolated) {reference_time:.1f} s")
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,64 @@
+import sys
+import time
+import argparse
+import numpy as np
+from utils import fast_stats, statistical_tools, sensitivity
+from src.check_fast_stats import make_fake_long_table
+
+# This script checks that the leave-one-out and subgroup statistics that
+# utils/sensitivity.py derives from the full-data ranks agree with running
+# fast_stats on each subset of participants, and times both.
+
+def direct_leave_one_out(X):
+    keep = ~np.eye(X.shape[0], dtype=bool)
+    subsets = np.stack([X[mask] for mask in keep])
+    W, Q, p = fast_stats.friedman(subsets)
+    _, w_vals, p_unc, p_corr, hedges = fast_stats.pairwise_wilcoxon(subsets)
+    return {'W': W, 'Q': Q, 'p': p, 'w_vals': w_vals, 'p_unc': p_unc, 'hedges': hedges}
+
+def incremental_leave_one_out(X):
+    W, Q, p = sensitivity.leave_one_out_friedman(X)
+    _, x, y = fast_stats.split_pairs(X)
+    w_vals, p_unc = sensitivity.leave_one_out_wilcoxon(x - y)
+    return {'W': W, 'Q': Q, 'p': p, 'w_vals': w_vals.T, 'p_unc': p_unc.T, 'hedges': sensitivity.leave_one_out_hedges(x, y).T}
+
+def compare(reference, incremental, rtol):
+    return [key for key in reference if not np.allclose(reference[key], incremental[key], rtol=rtol, atol=1e-12, equal_nan=True)]
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--participants", type=int, nargs='+', default=[8, 20, 60, 200], help="Fake dataset sizes to compare")
+    arg_parser.add_argument("--rtol", type=float, default=1e-9, help="Relative tolerance for agreement")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    measures = ['time', 'error', 'time_rounded', 'score']
+    rng = np.random.default_rng(args.seed)
+    failed = False
+    for n_participants in args.participants:
+        df_long = make_fake_long_table(n_participants, args.seed)
+        X_all, _, _ = statistical_tools.pivot_measures(df_long, measures)
+        for m, measure in enumerate(measures):
+            X = X_all[:, :, m]
+            X = X[~np.isnan(X).any(axis=1)]
+            start = time.perf_counter()
+            reference = direct_leave_one_out(X)
+            direct_time = time.perf_counter() - start
+            start = time.perf_counter()
+            incremental = incremental_leave_one_out(X)
+            incremental_time = time.perf_counter() - start
+
+            # Random subgroups against the same tests on the member rows
+            members = rng.random((5, X.shape[0])) < 0.5
+            members[:, :4] = True
+            W, Q, p = sensitivity.subgroup_friedman(X, members)
+            subgroup_reference = [fast_stats.friedman(X[mask]) for mask in members]
+            mismatches = compare(reference, incremental, args.rtol)
+            if not np.allclose(np.array([W, Q, p]), np.array(subgroup_reference).T, rtol=args.rtol, equal_nan=True):
+                mismatches.append('subgroup friedman')
+
+            status = 'agree' if not mismatches else f"mismatches in {mismatches}"
+            print(f"{n_participants} participants, {measure}: {status} (leave-one-out direct {direct_time * 1000:.1f} ms, incremental {incremental_time * 1000:.1f} ms)")
+            failed = failed or bool(mismatches)
+    if failed:
+        sys.exit(1)
@@ -1,51 +1,221 @@
+import os
 import argparse
-from utils import parse_core, statistical_tools, annotations, plot_essentials
+from utils import parse_core, statistical_tools, annotations, plot_essentials, render_queue, pipeline, results_sink, instrument, watcher, trajectories
+from utils.cache_utils import atomic_path
 from cfg import plot_config
 
+MEASURES = ['time', 'error']
+BOXPLOT_CONFIGS = {'time': plot_config.boxplot_config_time, 'error': plot_config.boxplot_config_error}
+LEARNING_CURVE_CONFIGS = {'time': plot_config.learning_curve_config_time, 'error': plot_config.learning_curve_config_error}
+
+def plot_configs(measure):
+    # (boxplot, learning curve) configs; measures derived from trajectories reuse the error layout
+    if measure in BOXPLOT_CONFIGS:
+        return BOXPLOT_CONFIGS[measure], LEARNING_CURVE_CONFIGS[measure]
+    title, unit = plot_config.trajectory_measure_labels.get(measure, (measure, measure))
+    return (
+        {**plot_config.boxplot_config_error, 'title': f'{title} by Condition', 'x_label': unit},
+        {**plot_config.learning_curve_config_error, 'title': f'{title} Learning Curve', 'y_label': unit}
+    )
+
+def write_validation_report(data_directory, validation_report):
+    for message in validation_report['issues']['message']:
+        print(message)
+    os.makedirs(os.path.join(data_directory, 'results'), exist_ok=True)
+    with atomic_path(os.path.join(data_directory, 'results', 'validation_report.json')) as tmp_path, open(tmp_path, 'w') as f:
+        f.write(parse_core.validation_report_to_json(validation_report))
+
+# Pipeline stages: each takes its declared inputs as keyword arguments and returns a dict of outputs
+
+def parse_stage(data_directory, workers, use_cache, validate, fail_fast, trajectories):
+    if not validate:
+        return {'df_long': parse_core.parse_data(data_directory, workers=workers, use_cache=use_cache, trajectories=trajectories)}
+    # Integrity checks run in the same pass that builds the long table
+    df_long, validation_report = parse_core.validate_and_parse(data_directory, workers=workers, use_cache=use_cache, fail_fast=fail_fast, trajectories=trajectories)
+    write_validation_report(data_directory, validation_report)
+    return {'df_long': df_long}
+
+def normality_stage(df_long, measures, data_directory):
+    # Shapiro-Wilk tests for normality; QQ plots are queued for the plots stage
+    figures = []
+    normality = {}
+    for measure in measures:
+        normality[measure] = {
+            'normality_cond': statistical_tools.check_normality_condition(df_long, measure, alpha=0.05, data_dir=data_directory, figure_queue=figures)
+        }
+    for measure in measures:
+        normality[measure]['normality_res'] = statistical_tools.check_normality_residuals(df_long, measure, alpha=0.05, data_dir=data_directory, figure_queue=figures)
+    return {'normality': normality, 'qq_figures': figures}
+
+def repeated_measures_stage(df_long, measures, resamples, seed, workers):
+    # All measures are pivoted and tested together
+    return {'repeated_measures': statistical_tools.compute_repeated_measures_batch(df_long, measures, parametric=False, resamples=resamples, seed=seed, workers=workers)}
+
+def learning_curve_stage(df_long, measures, data_directory, workers, forced):
+    # Mixed models are fitted per measure in parallel and warm-started from cached fits
+    return {'learning_curves': statistical_tools.learning_curves(df_long, measures, data_dir=data_directory, workers=workers, force=forced)}
+
+def annotations_stage(repeated_measures, measures):
+    # Pair -> significance label lookup, built once per pairwise table for the plots and the export
+    return {'annotation_index': {measure: annotations.annotation_index(repeated_measures[measure]) for measure in measures}}
+
+def collect_results(repeated_measures, normality, learning_curves, annotation_index, measures):
+    # Per-measure results in the form expected by results_sink
+    return {
+        measure: {
+            **repeated_measures[measure],
+            'annotations': annotation_index[measure],
+            'normality_res': normality[measure]['normality_res'],
+            'normality_cond': normality[measure]['normality_cond'],
+            'learning_curve': learning_curves[measure]
+        }
+        for measure in measures
+    }
+
+def export_stage(repeated_measures, normality, learning_curves, annotation_index, measures, data_directory, results_format):
+    results_dict = collect_results(repeated_measures, normality, learning_curves, annotation_index, measures)
+    results_path = results_sink.save_results(results_dict, data_dir=data_directory, sink=results_format)
+    return {'results_path': results_path}
+
+def plots_stage(df_long, repeated_measures, annotation_index, qq_figures, measures, data_directory, workers, force_plots):
+    figures = list(qq_figures)
+    for measure in measures:
+        # Create annotations for plotting annotator
+        measure_annotations = annotations.extract_condition_annotations(repeated_measures[measure], index=annotation_index[measure])
+        figures.append(render_queue.figure_spec(plot_essentials.boxplot, df_long, measure, plot_configs(measure)[0], data_directory, annotations_dict=measure_annotations, unique_id=0))
+    for measure in measures:
+        figures.append(render_queue.figure_spec(plot_essentials.plot_learning_curve, df_long, measure, data_directory, plot_configs(measure)[1]))
+    render_queue.render_figures(figures, data_directory, workers=workers, force=force_plots)
+    return {}
+
+STAGES = [
+    pipeline.stage('parse', parse_stage, inputs=['data_directory', 'workers', 'use_cache', 'validate', 'fail_fast', 'trajectories'], outputs=['df_long'], memoize=False),
+    pipeline.stage('normality', normality_stage, inputs=['df_long', 'measures', 'data_directory'], outputs=['normality', 'qq_figures']),
+    pipeline.stage('repeated_measures', repeated_measures_stage, inputs=['df_long', 'measures', 'resamples', 'seed', 'workers'], outputs=['repeated_measures']),
+    pipeline.stage('learning_curve', learning_curve_stage, inputs=['df_long', 'measures', 'data_directory', 'workers', pipeline.FORCED], outputs=['learning_curves']),
+    pipeline.stage('annotations', annotations_stage, inputs=['repeated_measures', 'measures'], outputs=['annotation_index']),
+    pipeline.stage('export', export_stage, inputs=['repeated_measures', 'normality', 'learning_curves', 'annotation_index', 'measures', 'data_directory', 'results_format'], outputs=['results_path'], files=['results_path']),
+    pipeline.stage('plots', plots_stage, inputs=['df_long', 'repeated_measures', 'annotation_index', 'qq_figures', 'measures', 'data_directory', 'workers', 'force_plots'], memoize=False),
+]
+STAGE_NAMES = [spec['name'] for spec in STAGES]
+
+# Options of one analysis; run_analysis() accepts any subset of them
+DEFAULT_CONFIG = {
+    'workers': None,
+    'use_cache': True,
+    'validate': False,
+    'fail_fast': False,
+    'force_plots': False,
+    'resamples': 0,
+    'seed': None,
+    'results_format': 'xlsx',
+    'trajectories': False,
+    'only': None,
+    'force': None
+}
+
+def analysis_context(data_directory, config):
+    config = {**DEFAULT_CONFIG, **config}
+    unknown = set(config) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown analysis options: {sorted(unknown)}")
+    context = {name: value for name, value in config.items() if name not in ('only', 'force')}
+    context['data_directory'] = data_directory
+    context['measures'] = MEASURES + (trajectories.trajectory_measures() if config['trajectories'] else [])
+    return context
+
+def run_analysis(data_dir, config=None, label=None):
+    # Runs the whole pipeline on one data directory and returns its named values
+    # (df_long, repeated_measures, learning_curves, results_path, ...). config: options
+    # from DEFAULT_CONFIG.
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    context = analysis_context(data_dir, config)
+    return pipeline.run_pipeline(STAGES, context, data_dir, only=config['only'], force=config['force'], workers=config['workers'], label=label)
+
+def add_analysis_arguments(arg_parser):
+    # Options shared by this script and src/batch_analysis.py
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="Number of parallel workers for JSON log ingestion (1 disables parallelism)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Re-parse every JSON log instead of using the ingest cache")
+    arg_parser.add_argument("--validate", action="store_true", help="Check log integrity during ingestion and write results/validation_report.json")
+    arg_parser.add_argument("--fail-fast", action="store_true", help="With --validate, stop at the first integrity issue")
+    arg_parser.add_argument("--force-plots", action="store_true", help="Re-render every figure even if its data and config are unchanged")
+    arg_parser.add_argument("--resamples", type=int, default=0, help="Add permutation p-values and bootstrap CIs from this many resamples (0 disables)")
+    arg_parser.add_argument("--seed", type=int, default=None, help="Random seed for --resamples")
+    arg_parser.add_argument("--results-format", choices=sorted(results_sink.RESULT_SINKS), default='xlsx', help="Results output: xlsx (openpyxl), xlsx-stream (xlsxwriter, constant memory), a parquet/csv directory or an sqlite database")
+    arg_parser.add_argument("--only", nargs='+', choices=STAGE_NAMES, default=None, help="Run only these stages (and the stages they depend on)")
+    arg_parser.add_argument("--force", nargs='+', choices=STAGE_NAMES + ['all'], default=None, help="Recompute these stages even if a cached result exists")
+    arg_parser.add_argument("--trajectories", action="store_true", help="Also read the per-sample trajectories in the logs and analyse MSE, RMSE, jerk and path-error percentiles derived from them")
+
+def config_from_args(args):
+    return {
+        'workers': args.workers,
+        'use_cache': not args.no_cache,
+        'validate': args.validate,
+        'fail_fast': args.fail_fast,
+        'force_plots': args.force_plots,
+        'resamples': args.resamples,
+        'seed': args.seed,
+        'results_format': args.results_format,
+        'trajectories': args.trajectories,
+        'only': args.only,
+        'force': args.force
+    }
+
+def watch_analysis(context, only=None, force=None, interval=2.0, debounce=5.0):
+    # Reruns the pipeline whenever the logs change. The long table stays in memory and
+    # grows by the rows of new files only; it is passed to the pipeline in place of the
+    # parse stage, so memoized stages and the figure manifest limit each rerun to the
+    # statistics and figures whose data changed. Runs until interrupted.
+    data_directory = context['data_directory']
+    state = None
+    seen = watcher.snapshot(data_directory)
+    while True:
+        try:
+            df_long, state = parse_core.update_long_table(data_directory, state, workers=context['workers'], use_cache=context['use_cache'], trajectories=context['trajectories'])
+            if context['validate']:
+                write_validation_report(data_directory, parse_core.build_validation_report(state['scanned']))
+            pipeline.run_pipeline(STAGES, {**context, 'df_long': df_long}, data_directory, only=only, force=force, workers=context['workers'])
+        except Exception as e:
+            # A bad batch of logs should not end the session; the next change triggers a retry
+            print(f"Warning: update failed, waiting for further changes: {e!r}")
+        # --force applies to the first run only
+        force = None
+        print(f"[watch] waiting for changes in {os.path.join(data_directory, 'json_logs')} (Ctrl+C to stop)")
+        current = watcher.wait_for_changes(data_directory, seen, interval=interval, debounce=debounce)
+        changes = watcher.describe_changes(seen, current)
+        print(f"[watch] {len(changes['added'])} added, {len(changes['modified'])} modified, {len(changes['removed'])} removed")
+        seen = current
+
 # Main function to handle user input and call relevant processing functions
 if __name__ == '__main__':
     print("Hello! This is the data analysis script.")
     # Argument parsing
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument("-d", "--directory", default="./data", help="Main data directory")
+    add_analysis_arguments(arg_parser)
+    arg_parser.add_argument("--profile", action="store_true", help="Print wall/CPU time, peak memory and row counts per stage and function, and write results/profile.json")
+    arg_parser.add_argument("--cprofile", action="store_true", help="With --profile, also save cProfile output of the slowest stage to results/profile_slowest_stage.prof")
+    arg_parser.add_argument("--watch", action="store_true", help="Keep running and update results and plots whenever JSON logs are added or changed")
+    arg_parser.add_argument("--poll-interval", type=float, default=2.0, help="With --watch, seconds between checks of json_logs/")
+    arg_parser.add_argument("--debounce", type=float, default=5.0, help="With --watch, seconds without further changes before an update starts")
     args = arg_parser.parse_args()
     data_directory = args.directory
 
-    df_long = parse_core.parse_data(data_directory)
-
-    # Shapiro-Wilk tests for normality
-    task_time_normality_cond = statistical_tools.check_normality_condition(df_long.copy(), 'time', alpha=0.05, data_dir=data_directory)
-    task_error_normality_cond = statistical_tools.check_normality_condition(df_long.copy(), 'error', alpha=0.05, data_dir=data_directory)
-    task_time_normality_res = statistical_tools.check_normality_residuals(df_long.copy(), 'time', alpha=0.05, data_dir=data_directory)
-    task_error_normality_res = statistical_tools.check_normality_residuals(df_long.copy(), 'error', alpha=0.05, data_dir=data_directory)
-
-    # Statistical tests
-    task_time_results = statistical_tools.compute_repeated_measures(df_long.copy(), 'time', parametric=False)
-    task_error_results = statistical_tools.compute_repeated_measures(df_long.copy(), 'error', parametric=False)
-    learning_time_results = statistical_tools.learning_curve(df_long.copy(), 'time')
-    learning_error_results = statistical_tools.learning_curve(df_long.copy(), 'error')
-
-    # Combine and save results
-    task_time_results['normality_res'] = task_time_normality_res
-    task_error_results['normality_res'] = task_error_normality_res
-    task_time_results['normality_cond'] = task_time_normality_cond
-    task_error_results['normality_cond'] = task_error_normality_cond
-    task_time_results['learning_curve'] = learning_time_results
-    task_error_results['learning_curve'] = learning_error_results
-    results_dict = {
-        'time': task_time_results,
-        'error': task_error_results
-    }
-    statistical_tools.save_results_to_excel(results_dict, data_dir=data_directory)
-
-    # Create annotations for plotting annotator
-    task_time_annotations = annotations.extract_condition_annotations(results_dict['time'])
-    task_error_annotations = annotations.extract_condition_annotations(results_dict['error'])
-
-    # Plotting
-    plot_essentials.boxplot(df_long.copy(), 'time', plot_config.boxplot_config_time, data_directory, annotations_dict=task_time_annotations, unique_id=0)
-    plot_essentials.boxplot(df_long.copy(), 'error', plot_config.boxplot_config_error, data_directory, annotations_dict=task_error_annotations, unique_id=0)
-    plot_essentials.plot_learning_curve(df_long.copy(), 'time', data_directory, plot_config.learning_curve_config_time)
-    plot_essentials.plot_learning_curve(df_long.copy(), 'error', data_directory, plot_config.learning_curve_config_error)
-else:
-    raise ImportError("This script is intended to be run directly, not imported as a module.")
+    config = config_from_args(args)
+    if args.profile or args.cprofile:
+        instrument.enable(cprofile=args.cprofile)
+    if args.watch:
+        try:
+            watch_analysis(analysis_context(data_directory, config), only=args.only, force=args.force, interval=args.poll_interval, debounce=args.debounce)
+        except KeyboardInterrupt:
+            print("Stopped watching.")
+    else:
+        run_analysis(data_directory, config)
+
+    if instrument.is_enabled():
+        results_dir = os.path.join(data_directory, 'results')
+        os.makedirs(results_dir, exist_ok=True)
+        instrument.print_summary()
+        print(f"Profile saved to {instrument.save_report(os.path.join(results_dir, 'profile.json'))}")
+        if args.cprofile:
+            instrument.dump_slowest_profile(os.path.join(results_dir, 'profile_slowest_stage.prof'))
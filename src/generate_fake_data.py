@@ -1,35 +1,155 @@
 import os
 import json
-import random
-from datetime import datetime
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from utils.parse_core import parallel_map
 
 # The purpose of this script is to generate fake JSON data
-# for demonstration or testing purposes.
+# for demonstration or testing purposes. Datasets are reproducible for a given
+# seed (independent of the number of workers) and come with a matching
+# other/order.xlsx, so they can be fed straight into data_analysis.py.
+
+BASE_TIME = datetime(2024, 1, 1)
+CORRUPTIONS = ['truncated', 'missing_mse', 'id_mismatch']
+TRAJECTORY_FIELDS = ['t', 'x', 'y', 'z', 'ref_x', 'ref_y', 'ref_z']
+
+def make_round(rng, extra_metrics):
+    values = {
+        "t": round(float(rng.uniform(100, 200)), 6),
+        "mse": round(float(rng.uniform(500, 1500)), 6)
+    }
+    for i in range(extra_metrics):
+        values[f"metric_{i}"] = round(float(rng.normal()), 6)
+    return values
+
+def make_trajectory(rng, samples):
+    # Noisy tracking of a circular reference path sampled at ~100 Hz
+    t = np.cumsum(rng.uniform(0.008, 0.012, samples))
+    ref = np.column_stack([np.cos(t / 5), np.sin(t / 5), np.full(samples, 1.0)])
+    pos = ref + rng.normal(scale=rng.uniform(0.01, 0.05), size=(samples, 3))
+    columns = np.column_stack([t, pos, ref]).round(6)
+    return [dict(zip(TRAJECTORY_FIELDS, row)) for row in columns.tolist()]
+
+def corrupt(text, data, kind):
+    if kind == 'truncated':
+        return text[:len(text) // 2]
+    if kind == 'missing_mse':
+        del data["round_data"]["mse"]
+    else:
+        data["round_data"]["id"] = "x" + data["round_data"]["id"]
+    return json.dumps(data)
+
+def write_participant_files(job):
+    # One participant per job; its random stream comes from its own child seed
+    out_dir, pid, n_modes, n_files, rounds_per_file, extra_metrics, trajectory_samples, corrupt_fraction, seed_seq = job
+    rng = np.random.default_rng(seed_seq)
+    participant_id = f"{pid:02d}"
+    order = [int(mode) for mode in rng.permutation(n_modes)]
+    corrupted = []
+    for mode in range(n_modes):
+        for i in range(n_files):
+            stamp = BASE_TIME + timedelta(minutes=(pid * n_modes + mode) * n_files + i)
+            filename = f"{participant_id}_{mode}_{stamp.strftime('%Y%m%d%H%M%S')}{rng.integers(1000, 10000)}.json"
+            rounds = [make_round(rng, extra_metrics) for _ in range(rounds_per_file)]
+            # round_data summarises the rounds the way the parser expects
+            summary = {key: round(float(np.mean([r[key] for r in rounds])), 6) for key in rounds[0]}
+            data = {"round_data": {"id": participant_id, "mode": mode, **summary}}
+            if rounds_per_file > 1:
+                data["rounds"] = rounds
+            if trajectory_samples:
+                # mse is then the mean squared path error of the trajectory
+                data["trajectory"] = make_trajectory(rng, trajectory_samples)
+                errors = [
+                    sum((s[axis] - s[f"ref_{axis}"]) ** 2 for axis in 'xyz') for s in data["trajectory"]
+                ]
+                data["round_data"]["mse"] = float(np.mean(errors))
+            text = json.dumps(data)
+            if rng.random() < corrupt_fraction:
+                kind = CORRUPTIONS[rng.integers(len(CORRUPTIONS))]
+                text = corrupt(text, data, kind)
+                corrupted.append((filename, kind))
+            with open(os.path.join(out_dir, filename), "w") as f:
+                f.write(text)
+    return participant_id, order, corrupted
+
+def write_order_file(data_dir, orders, n_modes):
+    # Same layout as the real order file: a title row, then participantID, condA, condB, ...
+    columns = ['participantID'] + [f"cond{chr(ord('A') + i)}" for i in range(n_modes)]
+    order_df = pd.DataFrame([[int(pid), *order] for pid, order in orders], columns=columns)
+    os.makedirs(os.path.join(data_dir, 'other'), exist_ok=True)
+    order_path = os.path.join(data_dir, 'other', 'order.xlsx')
+    with pd.ExcelWriter(order_path) as writer:
+        pd.DataFrame([['order']]).to_excel(writer, index=False, header=False)
+        order_df.to_excel(writer, index=False, startrow=1)
+    return order_path
 
 def generate_fake_json_files(
     out_dir,
     n_participants=5,
     n_modes=3,
-    n_files_per_participant=1
+    n_files_per_participant=1,
+    rounds_per_file=1,
+    extra_metrics=0,
+    trajectory_samples=0,
+    corrupt_fraction=0.0,
+    seed=None,
+    workers=None
 ):
+    # Returns [(participantID, condition order, [(corrupted file, kind)])]
     os.makedirs(out_dir, exist_ok=True)
-    for pid in range(1, n_participants + 1):
-        participant_id = f"{pid:02d}"
-        for mode in range(n_modes):
-            for _ in range(n_files_per_participant):
-                timestamp = datetime.now().strftime("%Y%m%d%H%M%S") + str(random.randint(1000, 9999))
-                filename = f"{participant_id}_{mode}_{timestamp}.json"
-                data = {
-                    "round_data": {
-                        "id": participant_id,
-                        "mode": mode,
-                        "t": round(random.uniform(100, 200), 6),
-                        "mse": round(random.uniform(500, 1500), 6)
-                    }
-                }
-                with open(os.path.join(out_dir, filename), "w") as f:
-                    json.dump(data, f)
+    seeds = np.random.SeedSequence(seed).spawn(n_participants)
+    jobs = [
+        (out_dir, pid, n_modes, n_files_per_participant, rounds_per_file, extra_metrics, trajectory_samples, corrupt_fraction, seeds[pid - 1])
+        for pid in range(1, n_participants + 1)
+    ]
+    return list(parallel_map(write_participant_files, jobs, workers=workers, use_processes=True))
+
+def generate_dataset(data_dir, n_participants=5, n_modes=3, n_files_per_participant=1, rounds_per_file=1, extra_metrics=0, trajectory_samples=0, corrupt_fraction=0.0, seed=None, workers=None):
+    # json_logs/ plus the matching other/order.xlsx
+    written = generate_fake_json_files(
+        os.path.join(data_dir, 'json_logs'),
+        n_participants=n_participants,
+        n_modes=n_modes,
+        n_files_per_participant=n_files_per_participant,
+        rounds_per_file=rounds_per_file,
+        extra_metrics=extra_metrics,
+        trajectory_samples=trajectory_samples,
+        corrupt_fraction=corrupt_fraction,
+        seed=seed,
+        workers=workers
+    )
+    write_order_file(data_dir, [(pid, order) for pid, order, _ in written], n_modes)
+    return {
+        'files': n_participants * n_modes * n_files_per_participant,
+        'corrupted': [item for _, _, corrupted in written for item in corrupted]
+    }
 
 if __name__ == "__main__":
-    output_dir = os.path.join(os.getcwd(), "data", "json_logs")
-    generate_fake_json_files(output_dir, n_participants=10, n_modes=3, n_files_per_participant=1)
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("-d", "--directory", default=os.path.join(os.getcwd(), "data"), help="Data directory to write json_logs/ and other/order.xlsx into")
+    arg_parser.add_argument("-p", "--participants", type=int, default=10, help="Number of participants")
+    arg_parser.add_argument("--modes", type=int, default=3, help="Number of modes (conditions) per participant")
+    arg_parser.add_argument("--files-per-participant", type=int, default=1, help="Log files per participant and mode")
+    arg_parser.add_argument("--rounds", type=int, default=1, help="Rounds stored in each log file")
+    arg_parser.add_argument("--extra-metrics", type=int, default=0, help="Additional metric_<i> values per round")
+    arg_parser.add_argument("--trajectory-samples", type=int, default=0, help="Add a trajectory of this many samples to each log (mse is then computed from it)")
+    arg_parser.add_argument("--corrupt-fraction", type=float, default=0.0, help="Fraction of files to corrupt (truncated JSON, missing mse or mismatched id)")
+    arg_parser.add_argument("--seed", type=int, default=None, help="Random seed")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes (1 disables parallelism)")
+    args = arg_parser.parse_args()
+
+    summary = generate_dataset(
+        args.directory,
+        n_participants=args.participants,
+        n_modes=args.modes,
+        n_files_per_participant=args.files_per_participant,
+        rounds_per_file=args.rounds,
+        extra_metrics=args.extra_metrics,
+        trajectory_samples=args.trajectory_samples,
+        corrupt_fraction=args.corrupt_fraction,
+        seed=args.seed,
+        workers=args.workers
+    )
+    print(f"Wrote {summary['files']} log files ({len(summary['corrupted'])} corrupted) to {args.directory}")
@@ -0,0 +1,67 @@
+import os
+import json
+import argparse
+import pandas as pd
+from utils import parse_core, packed_dataset
+
+# This script converts between the per-file layout (json_logs/ + other/order.xlsx) and
+# a single packed Parquet or Arrow IPC file that parse_core reads when a data directory
+# has no json_logs/ folder. Only round_data.id/mode/t/mse and the integrity issues of
+# each log are packed, so unpacking writes minimal logs (without trajectories) and
+# cannot restore logs that were unreadable.
+
+def pack(data_dir, fmt='parquet', output=None, workers=None, use_cache=True):
+    scanned = parse_core.scan_logs(data_dir, workers=workers, use_cache=use_cache)
+    order_df = pd.read_excel(parse_core.order_path(data_dir), skiprows=1)
+    path = packed_dataset.write_packed(output or packed_dataset.packed_path(data_dir, fmt), scanned, order_df, fmt=fmt)
+    unreadable = sum(row is None for _, row, _ in scanned)
+    print(f"Packed {len(scanned)} logs ({unreadable} unreadable) and the order table into {path} ({os.path.getsize(path) / 2**20:.2f} MB)")
+    return path
+
+def unpack(data_dir, output):
+    packed = packed_dataset.find_packed(data_dir)
+    if packed is None:
+        raise FileNotFoundError(f"No packed dataset ({', '.join(packed_dataset.PACKED_FILES.values())}) in {data_dir}")
+    table = packed_dataset.read_packed(*packed, columns=['file', 'participantID', 'condition', 'time', 'error'])
+    json_dir = os.path.join(output, 'json_logs')
+    os.makedirs(json_dir, exist_ok=True)
+    skipped = []
+    for fname, pid, cond, t_val, mse_val in zip(*(table.column(col).to_pylist() for col in table.column_names)):
+        if pid is None:
+            skipped.append(fname)
+            continue
+        # Missing values are left out so the same integrity issues are reported again
+        round_data = {'id': pid, 'mode': cond}
+        if t_val is not None and t_val == t_val:
+            round_data['t'] = t_val
+        if mse_val is not None and mse_val == mse_val:
+            round_data['mse'] = mse_val
+        with open(os.path.join(json_dir, fname), 'w') as f:
+            json.dump({'round_data': round_data}, f)
+
+    order_df = packed_dataset.read_packed_order(*packed)
+    os.makedirs(os.path.join(output, 'other'), exist_ok=True)
+    # Same layout as the original: a title row, then the table
+    with pd.ExcelWriter(parse_core.order_path(output)) as writer:
+        pd.DataFrame([['order']]).to_excel(writer, index=False, header=False)
+        order_df.to_excel(writer, index=False, startrow=1)
+    print(f"Unpacked {table.num_rows - len(skipped)} logs into {json_dir}")
+    if skipped:
+        print(f"Note: unreadable logs cannot be restored: {sorted(skipped)}")
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("command", choices=['pack', 'unpack'], help="pack json_logs/ and order.xlsx into one file, or unpack such a file")
+    arg_parser.add_argument("-d", "--directory", default="./data", help="Main data directory")
+    arg_parser.add_argument("-o", "--output", default=None, help="pack: output file (default <directory>/packed_logs.<ext>); unpack: target data directory (required)")
+    arg_parser.add_argument("--format", choices=sorted(packed_dataset.PACKED_FILES), default='parquet', help="Packed file format")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="Number of parallel workers for reading the logs (1 disables parallelism)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Re-parse every JSON log instead of using the ingest cache")
+    args = arg_parser.parse_args()
+
+    if args.command == 'pack':
+        pack(args.directory, fmt=args.format, output=args.output, workers=args.workers, use_cache=not args.no_cache)
+    elif args.output is None:
+        arg_parser.error("unpack requires -o/--output")
+    else:
+        unpack(args.directory, args.output)
@@ -0,0 +1,47 @@
+import os
+import argparse
+from data_analysis import MEASURES
+from utils import parse_core, results_sink, sensitivity, trajectories
+
+# This script checks how much the results of data_analysis.py depend on single
+# participants and on the counterbalancing order. The logs are parsed once; the
+# Friedman and Wilcoxon tests are repeated with every participant left out and on
+# every order subgroup (same condition sequence, same first condition), and the
+# learning-curve models are refitted on the same subsets. Everything is written
+# to one table (results/sensitivity.xlsx by default) with a row per subset,
+# measure, test and term, marking results whose significance differs from the
+# full data ('flipped').
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("-d", "--directory", default="./data", help="Main data directory")
+    arg_parser.add_argument("-w", "--workers", type=int, default=None, help="Number of parallel workers for ingestion and model fits (1 disables parallelism)")
+    arg_parser.add_argument("--no-cache", action="store_true", help="Re-parse every JSON log instead of using the ingest cache")
+    arg_parser.add_argument("--trajectories", action="store_true", help="Also test the measures derived from the per-sample trajectories")
+    arg_parser.add_argument("--alpha", type=float, default=0.05, help="Significance level for the 'significant' and 'flipped' columns")
+    arg_parser.add_argument("--min-subgroup-size", type=int, default=5, help="Order subgroups with fewer participants are left out")
+    arg_parser.add_argument("--no-learning-curves", action="store_true", help="Skip the mixed-model refits (the slow part)")
+    arg_parser.add_argument("--results-format", choices=sorted(results_sink.RESULT_SINKS), default='xlsx', help="Output format, as in data_analysis.py")
+    args = arg_parser.parse_args()
+
+    data_directory = args.directory
+    measures = MEASURES + (trajectories.trajectory_measures() if args.trajectories else [])
+    df_long = parse_core.parse_data(data_directory, workers=args.workers, use_cache=not args.no_cache, trajectories=args.trajectories)
+    try:
+        order_df = parse_core.read_order_table(data_directory)
+    except FileNotFoundError:
+        print("Warning: no order table found, only leave-one-out results are computed.")
+        order_df = None
+
+    table = sensitivity.sensitivity_table(
+        df_long, measures, order_df=order_df, min_subgroup_size=args.min_subgroup_size,
+        learning_curves=not args.no_learning_curves, workers=args.workers, alpha=args.alpha
+    )
+    path = results_sink.write_sheets([('stability', table)], os.path.join(data_directory, 'results'), 'sensitivity', sink=args.results_format)
+
+    flips = table[table['flipped']]
+    print(f"{table['subset'].nunique() - 1} subsets, {len(table)} results, {len(flips)} differ in significance from the full data")
+    if len(flips):
+        counts = flips.groupby(['measure', 'test', 'term', 'analysis']).size().unstack(fill_value=0)
+        print(counts.to_string())
+    print(f"Sensitivity table saved to {path}")
@@ -1,42 +1,56 @@
+import itertools
+import numpy as np
 import pandas as pd
 
-def extract_condition_annotations(results, condition_pairs=None, omnibus_alpha=0.05):
-    if 'results' not in results or not isinstance(results['results'], pd.DataFrame):
-        return {}
+# Upper bounds (inclusive) on p-corr for the star labels; up to omnibus_alpha is '*', above is 'ns'
+STAR_LEVELS = [(1.00e-04, '****'), (1.00e-03, '***'), (1.00e-02, '**')]
+
+def star_labels(p_corr, alpha=0.05):
+    # Vectorised binning of p-values into star labels; NaN gives 'ns'
+    p_corr = np.asarray(p_corr, dtype=float)
+    conditions = [p_corr <= bound for bound, _ in STAR_LEVELS] + [p_corr <= alpha]
+    choices = [label for _, label in STAR_LEVELS] + ['*']
+    return np.select(conditions, choices, default='ns')
 
-    # Check omnibus test significance
-    if 'stat_analysis' in results and isinstance(results['stat_analysis'], pd.DataFrame):
-        p_unc = results['stat_analysis'].get('p-unc', [None])[0]
+def omnibus_significant(results, omnibus_alpha=0.05):
+    stat_analysis = results.get('stat_analysis')
+    if isinstance(stat_analysis, pd.DataFrame) and 'p-unc' in stat_analysis and len(stat_analysis):
+        p_unc = stat_analysis['p-unc'].iloc[0]
         if p_unc is not None and p_unc > omnibus_alpha:
-            # If not significant, return 'ns' for all pairs
-            pairwise_df = results['results']
-            if condition_pairs is None:
-                unique_conds = pd.unique(pairwise_df[['A', 'B']].values.ravel())
-                condition_pairs = [(str(a), str(b)) for i, a in enumerate(unique_conds) for b in unique_conds[i+1:]]
-            return {pair: 'ns' for pair in condition_pairs}
+            return False
+    return True
 
+def annotation_index(results, omnibus_alpha=0.05):
+    # {(A, B): label} for every row of the pairwise table, built in one pass. If the omnibus
+    # test is not significant every pair is 'ns'. Look pairs up with pair_label(), which is
+    # order-insensitive
+    if 'results' not in results or not isinstance(results['results'], pd.DataFrame):
+        return {}
     pairwise_df = results['results']
-    annotations = {}
+    if omnibus_significant(results, omnibus_alpha):
+        labels = star_labels(pairwise_df['p-corr'], omnibus_alpha)
+    else:
+        labels = np.full(len(pairwise_df), 'ns')
+    index = {}
+    for a, b, label in zip(pairwise_df['A'].astype(str), pairwise_df['B'].astype(str), labels):
+        # The first row of a pair wins
+        index.setdefault((a, b), str(label))
+    return index
 
+def pair_label(index, a, b):
+    return index.get((a, b)) or index.get((b, a)) or 'ns'
+
+def all_condition_pairs(pairwise_df):
+    unique_conds = pd.unique(pairwise_df[['A', 'B']].values.ravel())
+    return [(str(a), str(b)) for a, b in itertools.combinations(unique_conds, 2)]
+
+def extract_condition_annotations(results, condition_pairs=None, omnibus_alpha=0.05, index=None):
+    # index: a prebuilt annotation_index(results) to reuse
+    if 'results' not in results or not isinstance(results['results'], pd.DataFrame):
+        return {}
+    if index is None:
+        index = annotation_index(results, omnibus_alpha)
     # If no pairs specified, use all unique pairs found in the results
     if condition_pairs is None:
-        unique_conds = pd.unique(pairwise_df[['A', 'B']].values.ravel())
-        condition_pairs = [(str(a), str(b)) for i, a in enumerate(unique_conds) for b in unique_conds[i+1:]]
-
-    for a, b in condition_pairs:
-        # Find the row for this pair (order-insensitive)
-        row = pairwise_df[((pairwise_df['A'] == a) & (pairwise_df['B'] == b)) |
-                          ((pairwise_df['A'] == b) & (pairwise_df['B'] == a))]
-        if not row.empty:
-            p_corr = row['p-corr'].iloc[0]
-            annotation = (
-                '****' if p_corr <= 1.00e-04 else
-                '***' if p_corr <= 1.00e-03 else
-                '**' if p_corr <= 1.00e-02 else
-                '*' if p_corr <= omnibus_alpha else
-                'ns'
-            )
-            annotations[(a, b)] = annotation
-        else:
-            annotations[(a, b)] = 'ns'
-    return annotations
\ No newline at end of file
+        condition_pairs = all_condition_pairs(results['results'])
+    return {(a, b): pair_label(index, a, b) for a, b in condition_pairs}
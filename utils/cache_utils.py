@@ -0,0 +1,127 @@
+import os, json, pickle, hashlib, inspect, types
+from functools import lru_cache
+from importlib import metadata
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+# Shared helpers for the on-disk caches kept in data/cache/
+
+# Libraries whose version is part of code_fingerprint(): an upgrade can change results
+FINGERPRINT_PACKAGES = ['numpy', 'pandas', 'scipy', 'pingouin', 'statsmodels', 'matplotlib', 'seaborn', 'statannotations']
+FINGERPRINT_DIRS = [os.path.dirname(os.path.abspath(__file__)), os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cfg')]
+
+def cache_dir(data_dir):
+    return os.path.join(data_dir, 'cache')
+
+def hash_bytes(raw):
+    return hashlib.sha1(raw).hexdigest()
+
+def update_hash(h, obj):
+    # Feed a stable representation of obj into the hash object h
+    if isinstance(obj, pd.DataFrame):
+        h.update(repr((list(obj.columns), [str(t) for t in obj.dtypes])).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        h.update(repr((obj.name, str(obj.dtype))).encode())
+        h.update(pd.util.hash_pandas_object(obj).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(repr((obj.shape, str(obj.dtype))).encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        h.update(b'{')
+        for key in sorted(obj, key=repr):
+            update_hash(h, key)
+            update_hash(h, obj[key])
+        h.update(b'}')
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        h.update(type(obj).__name__.encode() + b'[')
+        for item in (sorted(obj, key=repr) if isinstance(obj, (set, frozenset)) else obj):
+            update_hash(h, item)
+        h.update(b']')
+    elif isinstance(obj, types.CodeType):
+        h.update(obj.co_code)
+        update_hash(h, obj.co_names)
+        for const in obj.co_consts:
+            update_hash(h, const)
+    elif callable(obj):
+        # By name and bytecode, so editing the function itself changes the hash
+        h.update(f"{getattr(obj, '__module__', '')}.{getattr(obj, '__qualname__', repr(obj))}".encode())
+        code = getattr(inspect.unwrap(obj), '__code__', None)
+        if code is not None:
+            update_hash(h, code)
+    else:
+        h.update(repr(obj).encode())
+
+def hash_object(*objs):
+    h = hashlib.sha1()
+    for obj in objs:
+        update_hash(h, obj)
+    return h.hexdigest()
+
+@lru_cache(maxsize=None)
+def code_fingerprint():
+    # Source of utils/ and cfg/ plus the versions of the numerical and plotting libraries.
+    # Part of the keys of cached results, so that neither a code change nor a library
+    # upgrade lets a rerun reuse results computed by the old code
+    h = hashlib.sha1()
+    for directory in FINGERPRINT_DIRS:
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py'):
+                h.update(name.encode())
+                with open(os.path.join(directory, name), 'rb') as f:
+                    h.update(f.read())
+    for package in FINGERPRINT_PACKAGES:
+        try:
+            version = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            version = None
+        h.update(f'{package}={version}'.encode())
+    return h.hexdigest()
+
+def load_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring unreadable cache file {path}: {e}")
+        return default
+
+@contextmanager
+def atomic_path(path):
+    # Yields a temporary path next to path (same extension, so writers can infer the format)
+    # and moves it over path once the block succeeds. Readers, and an interrupted run,
+    # therefore only ever see the old or the new file, never a partial one.
+    root, ext = os.path.splitext(path)
+    tmp_path = f'{root}.tmp{ext}'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        yield tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+def save_json(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_path(path) as tmp_path, open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=2)
+
+def load_pickle(path, default=None):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"Warning: ignoring unreadable cache file {path}: {e}")
+        return default
+
+def save_pickle(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_path(path) as tmp_path, open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
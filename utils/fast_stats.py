@@ -0,0 +1,123 @@
+from functools import lru_cache
+from itertools import combinations
+import numpy as np
+from utils.lazy_import import lazy_import
+
+special = lazy_import('scipy.special')
+
+# NumPy fast path for the repeated-measures tests. Every function works on
+# arrays with arbitrary leading batch dimensions (measures, resamples, ...)
+# followed by participants x conditions, so thousands of same-shaped
+# problems are solved in one call without pandas or pingouin overhead.
+# Results agree with pingouin/scipy (see src/check_fast_stats.py).
+
+def tie_bounds(sorted_a):
+    # First and last position of the tie group of every element of an array sorted along the last axis
+    n = sorted_a.shape[-1]
+    idx = np.broadcast_to(np.arange(n), sorted_a.shape)
+    first = np.ones(sorted_a.shape, dtype=bool)
+    first[..., 1:] = sorted_a[..., 1:] != sorted_a[..., :-1]
+    last = np.ones(sorted_a.shape, dtype=bool)
+    last[..., :-1] = first[..., 1:]
+    start = np.maximum.accumulate(np.where(first, idx, 0), axis=-1)
+    end = np.flip(np.minimum.accumulate(np.flip(np.where(last, idx, n - 1), axis=-1), axis=-1), axis=-1)
+    return start, end
+
+def rank_average(a):
+    # Average ranks along the last axis (NaNs last) and the tie term sum(t^3 - t) per slice
+    order = np.argsort(a, axis=-1, kind='mergesort')
+    sorted_a = np.take_along_axis(a, order, axis=-1)
+    start, end = tie_bounds(sorted_a)
+    ranks = np.empty(a.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, (start + end) / 2 + 1, axis=-1)
+    # Each element of a tie group of size t contributes t^2 - 1, i.e. t^3 - t per group
+    size = end - start + 1
+    ties = (size ** 2 - 1).sum(axis=-1)
+    return ranks, ties
+
+def friedman(X):
+    # X: (..., participants, conditions) -> Kendall's W, Friedman Q and p-value
+    ranks, ties = rank_average(X)
+    return friedman_from_rank_sums(ranks.sum(axis=-2), ties.sum(axis=-1), X.shape[-2])
+
+def friedman_from_rank_sums(rank_sums, ties, n):
+    # rank_sums: (..., conditions) sums of the within-participant ranks over n participants;
+    # ties: the summed tie terms. Lets subsets of participants reuse ranks computed once
+    k = rank_sums.shape[-1]
+    ssbn = (rank_sums ** 2).sum(axis=-1)
+    W = (12 * ssbn - 3 * n**2 * k * (k + 1) ** 2) / (n**2 * k * (k - 1) * (k + 1) - n * ties)
+    Q = n * (k - 1) * W
+    return W, Q, special.chdtrc(k - 1, Q)
+
+@lru_cache(maxsize=None)
+def wilcoxon_null_cdf(n):
+    # Exact CDF of the signed-rank statistic R+ for n non-zero differences
+    counts = np.zeros(n * (n + 1) // 2 + 1)
+    counts[0] = 1
+    for i in range(1, n + 1):
+        counts[i:] = counts[i:] + counts[:-i].copy()
+    cdf = np.cumsum(counts) / 2.0 ** n
+    cdf.setflags(write=False)
+    return cdf
+
+def wilcoxon(d):
+    # d: (..., participants) paired differences -> two-sided W statistic and p-value.
+    # Like scipy's method='auto', a slice uses the exact null distribution when it has
+    # at most 50 differences and no zeros, and the corrected normal approximation otherwise
+    n = d.shape[-1]
+    zeros = d == 0
+    d = np.where(zeros, np.nan, d)
+    count = n - zeros.sum(axis=-1)
+    ranks, ties = rank_average(np.abs(d))
+    r_plus = np.where(d > 0, ranks, 0).sum(axis=-1)
+    return signed_rank_test(r_plus, count, ties, n)
+
+def signed_rank_test(r_plus, count, ties, n):
+    # W and p-value from the rank sum of the positive differences, the number of non-zero
+    # differences (count) and their tie term, for slices of n differences
+    r_minus = count * (count + 1.) / 2 - r_plus
+    mn = count * (count + 1.) * 0.25
+    se = np.sqrt((count * (count + 1.) * (2. * count + 1.) - ties / 2) / 24)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (r_plus - mn) / se
+        z -= np.sign(z) * 0.5 / se
+    p = 2 * special.ndtr(-np.abs(z))
+
+    exact = (count == n) & (n <= 50)
+    if np.any(exact):
+        cdf = wilcoxon_null_cdf(n)
+        lower = cdf[np.clip(np.ceil(r_plus).astype(int), 0, len(cdf) - 1)]
+        upper_idx = np.floor(r_plus).astype(int) - 1
+        upper = 1 - np.where(upper_idx >= 0, cdf[np.clip(upper_idx, 0, len(cdf) - 1)], 0)
+        p = np.where(exact, np.clip(2 * np.minimum(upper, lower), 0, 1), p)
+    return np.minimum(r_plus, r_minus), p
+
+def holm(pvals, axis=-1):
+    # Holm step-down adjustment applied independently along `axis`
+    pvals = np.moveaxis(np.asarray(pvals, dtype=np.float64), axis, -1)
+    n_tests = pvals.shape[-1]
+    order = np.argsort(pvals, axis=-1)
+    p_sorted = np.take_along_axis(pvals, order, axis=-1)
+    p_corr = np.minimum(np.maximum.accumulate(p_sorted * np.arange(n_tests, 0, -1), axis=-1), 1)
+    result = np.empty_like(p_corr)
+    np.put_along_axis(result, order, p_corr, axis=-1)
+    return np.moveaxis(result, -1, axis)
+
+def paired_hedges(x, y):
+    n = x.shape[-1]
+    d = (x.mean(axis=-1) - y.mean(axis=-1)) / np.sqrt((x.var(axis=-1, ddof=1) + y.var(axis=-1, ddof=1)) / 2)
+    return d * (1 - (3 / (4 * (2 * n) - 9)))
+
+def split_pairs(X):
+    # X: (..., participants, conditions) -> condition pairs and the (..., pairs, participants) arrays of each side
+    pairs = list(combinations(range(X.shape[-1]), 2))
+    x = np.moveaxis(X[..., [a for a, _ in pairs]], -1, -2)
+    y = np.moveaxis(X[..., [b for _, b in pairs]], -1, -2)
+    return pairs, x, y
+
+def pairwise_wilcoxon(X):
+    # X: (..., participants, conditions) -> W, p-unc, p-corr (Holm) and Hedges' g, each (..., pairs)
+    pairs, x, y = split_pairs(X)
+    W, p_unc = wilcoxon(x - y)
+    p_corr = holm(p_unc, axis=-1) if len(pairs) > 1 else np.full_like(p_unc, np.nan)
+    return pairs, W, p_unc, p_corr, paired_hedges(x, y)
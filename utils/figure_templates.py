@@ -0,0 +1,65 @@
+import numpy as np
+from utils.cache_utils import hash_object
+from utils.lazy_import import lazy_import
+
+mpl_figure = lazy_import('matplotlib.figure')
+
+# Figures built once per plot config and reused for every figure drawn with it (e.g. the
+# subgroup variants of one plot). Creating the axes, seaborn's artists and styling, the
+# labels, the legend and the layout costs about as much as drawing the figure, so a
+# template keeps all of that and a new figure only replaces the data of the artists
+# before saving. Templates are plain Figures (not managed by pyplot) kept per process,
+# so every render worker holds its own; the least recently used ones are dropped.
+
+MAX_TEMPLATES = 32
+TEMPLATES = {}
+
+def template_key(kind, *parts):
+    return hash_object(kind, *parts)
+
+def new_figure(figsize):
+    return mpl_figure.Figure(figsize=figsize)
+
+def get_template(key, build):
+    # (template, built): built is True when build() just created it for the current data
+    template = TEMPLATES.pop(key, None)
+    built = template is None
+    if built:
+        template = build()
+    # Most recently used last
+    TEMPLATES[key] = template
+    while len(TEMPLATES) > MAX_TEMPLATES:
+        del TEMPLATES[next(iter(TEMPLATES))]
+    return template, built
+
+def clear():
+    TEMPLATES.clear()
+
+def tick_signature(ax):
+    # Widest tick label of each axis as it will be drawn; the layout only changes with it
+    signature = []
+    for axis in (ax.xaxis, ax.yaxis):
+        labels = axis.get_major_formatter().format_ticks(axis.get_majorticklocs())
+        signature.append(max(map(len, labels), default=0))
+    return tuple(signature)
+
+def fit_layout(template):
+    # tight_layout only when the tick labels need a different amount of room than before
+    signature = tick_signature(template['ax'])
+    if template.get('layout') != signature:
+        template['fig'].tight_layout()
+        template['layout'] = signature
+
+def rescale(ax, scalex=True, scaley=True, points=()):
+    # Recompute the data limits after artists were updated in place. relim() only sees
+    # lines and patches, so points of collections (bands, scatter) are passed in.
+    ax.relim()
+    for xy in points:
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        xy = xy[np.isfinite(xy).all(axis=1)]
+        if len(xy):
+            ax.update_datalim(xy, updatex=scalex, updatey=scaley)
+    ax.autoscale_view(scalex=scalex, scaley=scaley)
+
+def added_artists(ax, before):
+    return [artist for artist in ax.get_children() if artist not in before]
@@ -0,0 +1,50 @@
+import os, json
+import pandas as pd
+from utils.cache_utils import cache_dir, hash_bytes, code_fingerprint
+
+# Persistent per-file cache of parsed round_data rows, stored as Parquet in data/cache/.
+# The parser's code fingerprint is kept in the file metadata: rows parsed by other code are discarded.
+
+CACHE_COLUMNS = ['file', 'size', 'mtime_ns', 'sha1', 'participantID', 'condition', 'time', 'error', 'issues']
+
+def ingest_cache_path(data_dir):
+    return os.path.join(cache_dir(data_dir), 'ingest_cache.parquet')
+
+def content_hash(raw):
+    return hash_bytes(raw)
+
+def load_ingest_cache(data_dir):
+    # Returns {file name: (size, mtime_ns, sha1, row, issues)}; row is None for unreadable files
+    path = ingest_cache_path(data_dir)
+    if not os.path.exists(path):
+        return {}
+    try:
+        cache_df = pd.read_parquet(path)
+    except Exception as e:
+        print(f"Warning: ignoring unreadable ingest cache {path}: {e}")
+        return {}
+    if list(cache_df.columns) != CACHE_COLUMNS:
+        print(f"Warning: ignoring ingest cache with unexpected columns: {path}")
+        return {}
+    if cache_df.attrs.get('code_fingerprint') != code_fingerprint():
+        return {}
+    cache = {}
+    for fname, size, mtime_ns, sha1, pid, cond, t_val, mse_val, issues in cache_df.itertuples(index=False, name=None):
+        row = None if pid is None else (pid, cond, t_val, mse_val)
+        cache[fname] = (size, mtime_ns, sha1, row, [tuple(issue) for issue in json.loads(issues)])
+    return cache
+
+def save_ingest_cache(data_dir, cache):
+    path = ingest_cache_path(data_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    records = [
+        (fname, size, mtime_ns, sha1, *(row if row is not None else (None, None, float('nan'), float('nan'))), json.dumps(issues))
+        for fname, (size, mtime_ns, sha1, row, issues) in cache.items()
+    ]
+    cache_df = pd.DataFrame(records, columns=CACHE_COLUMNS)
+    cache_df = cache_df.astype({'size': 'int64', 'mtime_ns': 'int64', 'time': 'float64', 'error': 'float64'})
+    cache_df.attrs['code_fingerprint'] = code_fingerprint()
+    # Write to a temporary file first so an interrupted run never leaves a corrupt cache
+    tmp_path = path + '.tmp'
+    cache_df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
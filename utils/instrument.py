@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+# Timing and memory instrumentation. Nothing is recorded unless enable() was called
+# (data_analysis.py --profile), so instrumented functions cost one dict lookup otherwise.
+# Each record holds wall time, CPU time of the calling thread, the peak of traced
+# memory while the block ran (above its starting point) and the number of rows of the
+# first DataFrame involved. Stages run concurrently, so a stage's peak also counts
+# allocations made by stages running at the same time. The CPU time (thread_cpu_s) does
+# not include work a stage hands to worker threads or processes (parsing, mixed models,
+# rendering); functions run through call_collected() in a process pool appear as rows of
+# their own, with their worker's thread CPU. The same holds for the cProfile output of a
+# stage: time spent in pool workers shows up only as waiting for their results.
+
+STATE = {'enabled': False, 'cprofile': False, 'profiling': False}
+RECORDS = []
+OPEN_BLOCKS = []
+LOCK = threading.Lock()
+
+def enable(cprofile=False):
+    STATE['enabled'] = True
+    STATE['cprofile'] = cprofile
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def is_enabled():
+    return STATE['enabled']
+
+def is_profiling():
+    # With cprofile, run_pipeline runs stages one at a time so each profile covers one stage
+    return STATE['enabled'] and STATE['cprofile']
+
+def rows_of(*values):
+    # Rows of the first DataFrame found in values (tuples and dicts are searched one level deep)
+    for value in values:
+        if isinstance(value, pd.DataFrame):
+            return len(value)
+        if isinstance(value, (tuple, list)):
+            found = rows_of(*value)
+        elif isinstance(value, dict):
+            found = rows_of(*value.values())
+        else:
+            continue
+        if found is not None:
+            return found
+    return None
+
+def update_peaks():
+    # Fold the traced peak since the last event into every open block, then start a new interval
+    current, peak = tracemalloc.get_traced_memory()
+    for block in OPEN_BLOCKS:
+        block['peak'] = max(block['peak'], peak)
+    tracemalloc.reset_peak()
+    return current
+
+@contextmanager
+def measure(name, kind='function', rows=None):
+    # Yields the record so callers can fill in 'rows' once the result is known
+    if not STATE['enabled']:
+        yield {}
+        return
+    with LOCK:
+        block = {'start_memory': update_peaks(), 'peak': 0}
+        OPEN_BLOCKS.append(block)
+        # Only one profiler can be active per interpreter (an error from Python 3.12), so a
+        # stage that starts while another is profiled (pipelines run side by side) is not
+        profiler = None
+        if STATE['cprofile'] and kind == 'stage' and not STATE['profiling']:
+            profiler = cProfile.Profile()
+            STATE['profiling'] = True
+    record = {'name': name, 'kind': kind, 'rows': rows, 'pid': os.getpid()}
+    wall, cpu = time.perf_counter(), time.thread_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            STATE['profiling'] = False
+        record['wall_s'] = time.perf_counter() - wall
+        record['thread_cpu_s'] = time.thread_time() - cpu
+        with LOCK:
+            update_peaks()
+            OPEN_BLOCKS.remove(block)
+            record['peak_mb'] = max(block['peak'] - block['start_memory'], 0) / 2**20
+            if profiler is not None:
+                record['profile'] = profiler
+            RECORDS.append(record)
+
+def instrumented(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not STATE['enabled']:
+            return func(*args, **kwargs)
+        with measure(func.__qualname__, rows=rows_of(*args, *kwargs.values())) as record:
+            result = func(*args, **kwargs)
+            if record.get('rows') is None:
+                record['rows'] = rows_of(result)
+            return result
+    return wrapper
+
+def call_collected(enabled, func, *args, **kwargs):
+    # For process pools: run func with the parent's instrumentation setting and return
+    # (result, records) so the parent can merge the records with add_records()
+    if not enabled:
+        return func(*args, **kwargs), []
+    enable()
+    start = len(RECORDS)
+    result = func(*args, **kwargs)
+    return result, RECORDS[start:]
+
+def add_records(records):
+    with LOCK:
+        RECORDS.extend(records)
+
+def summary_table():
+    records = [{k: v for k, v in r.items() if k != 'profile'} for r in RECORDS]
+    if not records:
+        return pd.DataFrame(columns=['kind', 'name', 'calls', 'wall_s', 'thread_cpu_s', 'peak_mb', 'rows'])
+    df = pd.DataFrame(records)
+    table = df.groupby(['kind', 'name'], sort=False).agg(
+        calls=('wall_s', 'size'),
+        wall_s=('wall_s', 'sum'),
+        thread_cpu_s=('thread_cpu_s', 'sum'),
+        peak_mb=('peak_mb', 'max'),
+        rows=('rows', 'max')
+    ).reset_index()
+    table['rows'] = table['rows'].astype('Int64')
+    # Pipeline stages first, then functions, slowest first
+    table['order'] = (table['kind'] != 'stage').astype(int)
+    return table.sort_values(['order', 'wall_s'], ascending=[True, False]).drop(columns='order').reset_index(drop=True)
+
+def print_summary():
+    table = summary_table()
+    print(f"{'kind':<9} {'name':<42} {'calls':>6} {'wall (s)':>9} {'thread cpu (s)':>14} {'peak (MB)':>10} {'rows':>9}")
+    for row in table.itertuples(index=False):
+        rows = '-' if pd.isna(row.rows) else int(row.rows)
+        print(f"{row.kind:<9} {row.name:<42} {row.calls:>6} {row.wall_s:>9.3f} {row.thread_cpu_s:>14.3f} {row.peak_mb:>10.1f} {rows:>9}")
+
+def save_report(path):
+    records = [{k: v for k, v in r.items() if k != 'profile'} for r in RECORDS]
+    summary = summary_table().astype(object).where(lambda df: df.notna(), None)
+    with open(path, 'w') as f:
+        json.dump({'summary': summary.to_dict(orient='records'), 'records': records}, f, indent=2)
+    return path
+
+def dump_slowest_profile(path, top=20):
+    # cProfile output of the slowest pipeline stage (requires enable(cprofile=True))
+    profiled = [r for r in RECORDS if 'profile' in r]
+    if not profiled:
+        return None
+    slowest = max(profiled, key=lambda r: r['wall_s'])
+    slowest['profile'].dump_stats(path)
+    print(f"cProfile of the slowest stage '{slowest['name']}' ({slowest['wall_s']:.2f} s) saved to {path}")
+    pstats.Stats(slowest['profile']).sort_stats('cumulative').print_stats(top)
+    return slowest['name']
@@ -0,0 +1,25 @@
+import sys
+import importlib
+
+# Heavy optional-looking dependencies (pingouin, statsmodels, seaborn, ...) are
+# only imported on first attribute access so that importing utils stays cheap.
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+def lazy_import(name):
+    # Hand out the real module if something already imported it
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
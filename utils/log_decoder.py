@@ -0,0 +1,120 @@
+import json
+import threading
+import importlib
+from typing import Optional, Union
+from cfg.data_config import json_decoder
+
+# Decoders that turn the raw bytes of a JSON log into its round_data mapping. Only
+# round_data.id/mode/t/mse are used, so the fast backends avoid building Python
+# objects for the rest of the document (trajectories can be most of a log):
+#   msgspec  - decodes into a typed schema and skips unknown fields
+#   simdjson - parses lazily and only materialises round_data
+#   orjson   - decodes the whole document, but much faster than the stdlib
+# All of them still reject malformed documents. Anything a fast backend does not
+# accept (NaN literals, non-UTF-8 text, unexpected types, ...) is decided by the
+# stdlib decoder, so rows and integrity issues never depend on the backend.
+
+PREFERENCE = ['msgspec', 'simdjson', 'orjson', 'json']
+
+def stdlib_round_data(raw):
+    return json.loads(raw).get('round_data', {})
+
+def make_msgspec():
+    msgspec = importlib.import_module('msgspec')
+
+    # Missing and null t/mse both become None, as with dict.get()
+    class RoundData(msgspec.Struct):
+        id: Union[str, int, float] = ''
+        mode: Union[str, int, float] = ''
+        t: Optional[float] = None
+        mse: Optional[float] = None
+
+    class LogFile(msgspec.Struct):
+        round_data: RoundData = msgspec.field(default_factory=RoundData)
+
+    decoder = msgspec.json.Decoder(LogFile)
+
+    def decode(raw):
+        round_data = decoder.decode(raw).round_data
+        return {'id': round_data.id, 'mode': round_data.mode, 't': round_data.t, 'mse': round_data.mse}
+    return decode
+
+def make_simdjson():
+    simdjson = importlib.import_module('simdjson')
+    # A parser is reused for every document but must not be shared between threads
+    local = threading.local()
+
+    def decode(raw):
+        parser = getattr(local, 'parser', None)
+        if parser is None:
+            parser = local.parser = simdjson.Parser()
+        document = parser.parse(raw)
+        if not isinstance(document, simdjson.Object):
+            raise TypeError("log is not a JSON object")
+        if 'round_data' not in document:
+            return {}
+        # Copied out before the parser is reused; non-objects fail here and go to the stdlib
+        return document['round_data'].as_dict()
+    return decode
+
+def make_orjson():
+    orjson = importlib.import_module('orjson')
+
+    def decode(raw):
+        return orjson.loads(raw).get('round_data', {})
+    return decode
+
+DECODERS = {
+    'msgspec': make_msgspec,
+    'simdjson': make_simdjson,
+    'orjson': make_orjson,
+    'json': lambda: stdlib_round_data,
+}
+
+def load_decoder(name='auto'):
+    # Returns (backend name, decode function); 'auto' takes the first installed backend
+    if name != 'auto' and name not in DECODERS:
+        raise ValueError(f"Unknown JSON decoder '{name}', expected 'auto' or one of {PREFERENCE}")
+    for candidate in (PREFERENCE if name == 'auto' else [name]):
+        try:
+            return candidate, DECODERS[candidate]()
+        except ImportError:
+            if name != 'auto':
+                raise
+    return 'json', stdlib_round_data
+
+# Resolved on first use so importing parse_core does not import a decoder library
+ACTIVE = {}
+
+def active_decoder():
+    if 'decode' not in ACTIVE:
+        ACTIVE['name'], ACTIVE['decode'] = load_decoder(json_decoder)
+    return ACTIVE['name'], ACTIVE['decode']
+
+def decode_round_data(raw, decode=None):
+    # decode: a function returned by load_decoder(); defaults to the configured backend
+    if decode is None:
+        _, decode = active_decoder()
+    if decode is stdlib_round_data:
+        return stdlib_round_data(raw)
+    try:
+        return decode(raw)
+    except Exception:
+        return stdlib_round_data(raw)
+
+def load_document_decoder():
+    # Whole-document decoding for trajectory ingestion, which needs the sample arrays
+    for name, attribute in [('orjson', 'loads'), ('msgspec.json', 'decode')]:
+        try:
+            return getattr(importlib.import_module(name), attribute)
+        except ImportError:
+            continue
+    return json.loads
+
+def decode_document(raw):
+    if 'document' not in ACTIVE:
+        ACTIVE['document'] = load_document_decoder()
+    try:
+        return ACTIVE['document'](raw)
+    except Exception:
+        return json.loads(raw)
@@ -0,0 +1,94 @@
+import os
+import json
+import pandas as pd
+from utils.lazy_import import lazy_import
+from utils.cache_utils import atomic_path
+
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+ds = lazy_import('pyarrow.dataset')
+pafs = lazy_import('pyarrow.fs')
+
+# Single-file alternative to data/json_logs/ + other/order.xlsx (see src/pack_dataset.py).
+# Each log becomes one row with its parsed round_data and integrity issues, in the same
+# form as the ingest cache; participantID is null for unreadable logs. Rows are sorted by
+# participant and written in row groups, so reading some columns or participants only
+# touches the matching parts of the file. The order table is kept in the file metadata.
+
+PACKED_FILES = {'parquet': 'packed_logs.parquet', 'arrow': 'packed_logs.arrow'}
+PACK_COLUMNS = ['file', 'participantID', 'condition', 'time', 'error', 'issues']
+ORDER_METADATA_KEY = b'order'
+ROW_GROUP_SIZE = 64 * 1024
+
+def packed_path(data_dir, fmt='parquet'):
+    return os.path.join(data_dir, PACKED_FILES[fmt])
+
+def find_packed(data_dir):
+    # (path, format) of the packed dataset in data_dir, or None
+    for fmt, name in PACKED_FILES.items():
+        path = os.path.join(data_dir, name)
+        if os.path.exists(path):
+            return path, fmt
+    return None
+
+def pack_schema(order_df):
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    order = {
+        'columns': [str(col) for col in order_df.columns],
+        'data': order_df.astype(object).where(order_df.notna(), None).values.tolist()
+    }
+    return pa.schema([
+        ('file', pa.string()),
+        ('participantID', dictionary),
+        ('condition', dictionary),
+        ('time', pa.float64()),
+        ('error', pa.float64()),
+        ('issues', pa.string())
+    ], metadata={ORDER_METADATA_KEY: json.dumps(order).encode()})
+
+def write_packed(path, scanned, order_df, fmt='parquet'):
+    # scanned: [(file name, row or None, issues)] as returned by parse_core.scan_logs
+    records = sorted(scanned, key=lambda item: (item[1] is None, item[1][0] if item[1] else '', item[0]))
+    rows = [row or (None, None, float('nan'), float('nan')) for _, row, _ in records]
+    columns = {
+        'file': [fname for fname, _, _ in records],
+        'participantID': [row[0] for row in rows],
+        'condition': [row[1] for row in rows],
+        'time': [row[2] for row in rows],
+        'error': [row[3] for row in rows],
+        'issues': [json.dumps(issues) for _, _, issues in records]
+    }
+    table = pa.Table.from_pydict(columns, schema=pack_schema(order_df))
+    with atomic_path(path) as tmp_path:
+        if fmt == 'parquet':
+            pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, write_statistics=True)
+        else:
+            # Uncompressed record batches can be memory mapped and used without copying
+            with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table, max_chunksize=ROW_GROUP_SIZE)
+    return path
+
+def open_packed(path, fmt):
+    filesystem = pafs.LocalFileSystem(use_mmap=True)
+    return ds.dataset(path, format='parquet' if fmt == 'parquet' else 'ipc', filesystem=filesystem)
+
+def read_packed(path, fmt, columns=None, participants=None, readable=None):
+    # participants: participantIDs as stored in round_data.id; readable: True/False keeps
+    # only readable/unreadable logs. Both are pushed down to the row groups.
+    dataset = open_packed(path, fmt)
+    conditions = []
+    if participants is not None:
+        conditions.append(ds.field('participantID').isin([str(pid) for pid in participants]))
+    if readable is not None:
+        conditions.append(ds.field('participantID').is_valid() if readable else ~ds.field('participantID').is_valid())
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression)
+
+def read_packed_order(path, fmt):
+    metadata = open_packed(path, fmt).schema.metadata or {}
+    if ORDER_METADATA_KEY not in metadata:
+        raise ValueError(f"Packed dataset {path} has no order table")
+    order = json.loads(metadata[ORDER_METADATA_KEY])
+    return pd.DataFrame(order['data'], columns=order['columns'])
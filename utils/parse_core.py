@@ -1,63 +1,363 @@
-import os, json, sys
+import os, re, json, sys
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+from cfg.data_config import measure_dtype
+from utils import ingest_cache, packed_dataset, worker_pool
+from utils.log_decoder import decode_round_data
+from utils.trajectories import add_trajectory_measures, trajectory_measures
+from utils.instrument import instrumented
 
-def parse_data(data_dir=os.path.join(os.getcwd(), 'data')):
-    data_directory=os.path.join(data_dir, 'json_logs')
+LONG_COLUMNS = ['participantID', 'condition', 'time', 'error']
+ISSUE_COLUMNS = ['file', 'participantID', 'issue', 'message']
+FILENAME_PATTERN = re.compile(r'(\d+)_([0-2])_.*\.json$')
+EXPECTED_MODES = {'0', '1', '2'}
+ORDER_COLUMNS = ['condA', 'condB', 'condC']
+TRIAL_IDS = list(range(1, len(ORDER_COLUMNS) + 1))
+
+class IntegrityIssue(ValueError):
+    # Raised by fail_fast scans at the first issue; record is one row of ISSUE_COLUMNS
+    def __init__(self, fname, pid, issue, message):
+        super().__init__(message)
+        self.record = (fname, pid, issue, message)
+
+def issue_pid(fname, row):
+    match = FILENAME_PATTERN.match(fname)
+    return match.group(1) if match else (row[0] if row else None)
+
+def is_trial_log(name):
+    return 'trial' in name.lower()
+
+def iter_log_entries(data_directory, include_trial_logs=False):
+    # Stream directory entries instead of materialising the full listing. Logs with 'trial'
+    # in their name are left out of the analysis; the integrity checker still includes them
+    with os.scandir(data_directory) as entries:
+        for entry in entries:
+            if not include_trial_logs and is_trial_log(entry.name):
+                continue
+            if entry.name.endswith('.json') and entry.is_file():
+                yield entry
+
+def parse_round_data(round_data):
+    t_val = round_data.get('t')
+    mse_val = round_data.get('mse')
+    return (
+        str(round_data.get('id', '')),
+        str(round_data.get('mode', '')),
+        float(t_val) if t_val is not None else float('nan'),
+        float(mse_val) if mse_val is not None else float('nan')
+    )
+
+def parse_log_bytes(raw):
+    return parse_round_data(decode_round_data(raw))
+
+def inspect_log_bytes(fname, raw):
+    # Decode once and return both the parsed row and its integrity issues
+    try:
+        round_data = decode_round_data(raw)
+        row = parse_round_data(round_data)
+    except Exception as e:
+        return None, [('read_error', f"Error reading {fname}: {e}")]
+    issues = []
+    match = FILENAME_PATTERN.match(fname)
+    if not match:
+        issues.append(('filename_format', f"Filename format issue: {fname}"))
+    elif (match.group(1), match.group(2)) != row[:2]:
+        issues.append(('id_mode_mismatch', f"ID/mode mismatch in {fname}: filename ({match.group(1)}, {match.group(2)}) vs round_data ({row[0]}, {row[1]})"))
+    if round_data.get('t') is None:
+        issues.append(('missing_t', f"Missing 't' in round_data for {fname}"))
+    if round_data.get('mse') is None:
+        issues.append(('missing_mse', f"Missing 'mse' in round_data for {fname}"))
+    return row, issues
+
+def inspect_log_file(job):
+    # Files whose content hash matches the cache are not decoded again
+    fname, fpath, cached_hash = job
+    with open(fpath, 'rb') as f:
+        raw = f.read()
+    digest = ingest_cache.content_hash(raw)
+    if digest == cached_hash:
+        return digest, None
+    return digest, inspect_log_bytes(fname, raw)
+
+def apply_chunk(func, chunk):
+    return [func(item) for item in chunk]
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def parallel_map(func, items, workers=None, use_processes=False, chunksize=16):
+    if workers == 1:
+        yield from map(func, items)
+        return
+    workers = workers or os.cpu_count() or 1
+    pool = worker_pool.process_pool(workers) if use_processes else ThreadPoolExecutor(max_workers=workers)
+    with pool as executor:
+        # Results come back in input order. Only a bounded number of chunks is in
+        # flight, so stopping early (fail-fast) never waits for the whole directory
+        pending = deque()
+        for chunk in iter_chunks(items, chunksize):
+            pending.append(executor.submit(apply_chunk, func, chunk))
+            if len(pending) > 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+@instrumented
+def scan_logs(data_dir, workers=None, use_processes=False, use_cache=True, fail_fast=False, cache=None, include_trial_logs=False):
+    # Returns [(file name, row or None, issues)] in directory order.
+    # cache: ingest cache dict kept in memory by the caller (watch mode); it is updated in place
+    data_directory = os.path.join(data_dir, 'json_logs')
+    if cache is None:
+        cache = ingest_cache.load_ingest_cache(data_dir) if use_cache else {}
+
+    # Only stat() the files here; unchanged files are never opened
+    listing = []
+    for entry in iter_log_entries(data_directory, include_trial_logs):
+        st = entry.stat()
+        listing.append((entry.name, entry.path, st.st_size, st.st_mtime_ns))
+    stale = [item for item in listing if cache.get(item[0], (None, None))[:2] != (item[2], item[3])]
+
+    if fail_fast:
+        stale_names = {item[0] for item in stale}
+        for fname, _, _, _ in listing:
+            if fname not in stale_names and cache[fname][4]:
+                raise IntegrityIssue(fname, issue_pid(fname, cache[fname][3]), *cache[fname][4][0])
+
+    jobs = [(fname, fpath, cache.get(fname, (None, None, None))[2]) for fname, fpath, _, _ in stale]
+    inspected = parallel_map(inspect_log_file, jobs, workers=workers, use_processes=use_processes)
+    for (fname, _, size, mtime_ns), (digest, result) in zip(stale, inspected):
+        row, issues = cache[fname][3:] if result is None else result
+        if fail_fast and issues:
+            raise IntegrityIssue(fname, issue_pid(fname, row), *issues[0])
+        cache[fname] = (size, mtime_ns, digest, row, issues)
+
+    # Drop rows for files that no longer exist (trial logs are only listed by the integrity
+    # checker, so other scans keep their rows)
+    present = {item[0] for item in listing}
+    deleted = [fname for fname in cache if fname not in present and (include_trial_logs or not is_trial_log(fname))]
+    for fname in deleted:
+        del cache[fname]
+
+    if use_cache and (stale or deleted):
+        ingest_cache.save_ingest_cache(data_dir, cache)
+    return [(fname, *cache[fname][3:]) for fname, _, _, _ in listing]
+
+def ordered_categorical(codes, lookup):
+    # Categories sorted once here so downstream code never has to re-cast or re-sort them
+    values = pd.Categorical.from_codes(codes, categories=list(lookup))
+    return values.reorder_categories(sorted(lookup)).as_ordered()
+
+@instrumented
+def build_long_table(parsed_rows, measure_dtype=measure_dtype):
+    # Accumulate column-wise: categorical codes for IDs, float64 buffers for measures
+    pid_codes, cond_codes = array('l'), array('l')
+    pid_lookup, cond_lookup = {}, {}
+    times, errors = array('d'), array('d')
+    for pid, cond, t_val, mse_val in parsed_rows:
+        pid_codes.append(pid_lookup.setdefault(pid, len(pid_lookup)))
+        cond_codes.append(cond_lookup.setdefault(cond, len(cond_lookup)))
+        times.append(t_val)
+        errors.append(mse_val)
+    return pd.DataFrame({
+        'participantID': ordered_categorical(pid_codes, pid_lookup),
+        'condition': ordered_categorical(cond_codes, cond_lookup),
+        'time': pd.Series(times, dtype=measure_dtype),
+        'error': pd.Series(errors, dtype=measure_dtype)
+    }, columns=LONG_COLUMNS)
+
+def packed_source(data_dir):
+    # A packed dataset (src/pack_dataset.py) is used when there is no json_logs/ directory
+    if os.path.isdir(os.path.join(data_dir, 'json_logs')):
+        return None
+    return packed_dataset.find_packed(data_dir)
+
+@instrumented
+def scan_packed(data_dir, participants=None, fail_fast=False):
+    # Same result as scan_logs, read from the packed dataset
+    path, fmt = packed_source(data_dir)
+    table = packed_dataset.read_packed(path, fmt, columns=packed_dataset.PACK_COLUMNS, participants=participants)
+    scanned = []
+    for fname, pid, cond, t_val, mse_val, issues in zip(*(table.column(col).to_pylist() for col in packed_dataset.PACK_COLUMNS)):
+        issues = [tuple(issue) for issue in json.loads(issues)]
+        row = None if pid is None else (pid, cond, float('nan') if t_val is None else t_val, float('nan') if mse_val is None else mse_val)
+        if fail_fast and issues:
+            raise IntegrityIssue(fname, issue_pid(fname, row), *issues[0])
+        scanned.append((fname, row, issues))
+    return scanned
+
+def sorted_categorical(values):
+    # Ordered categorical over the sorted values that occur, as built by build_long_table
+    values = values.astype('category').cat.remove_unused_categories()
+    return values.cat.reorder_categories(sorted(values.cat.categories), ordered=True)
+
+@instrumented
+def load_packed_long_table(data_dir, participants=None):
+    # Reads only the four long-table columns of readable logs; the dictionary-encoded
+    # ID columns arrive as categoricals without building Python strings per row
+    path, fmt = packed_source(data_dir)
+    table = packed_dataset.read_packed(path, fmt, columns=LONG_COLUMNS, participants=participants, readable=True)
+    frame = table.to_pandas()
+    return pd.DataFrame({
+        'participantID': sorted_categorical(frame['participantID']),
+        'condition': sorted_categorical(frame['condition']),
+        'time': frame['time'].astype(measure_dtype),
+        'error': frame['error'].astype(measure_dtype)
+    }, columns=LONG_COLUMNS)
+
+def trajectory_measures_for(data_dir, df_long, fnames, packed, workers, use_cache):
+    # Packed datasets keep only round_data, so their trajectory measures are NaN
+    if packed:
+        print("Warning: packed datasets contain no trajectories; trajectory measures are left empty")
+        return df_long.assign(**{measure: pd.Series(float('nan'), index=df_long.index, dtype=measure_dtype) for measure in trajectory_measures()})
+    return add_trajectory_measures(data_dir, df_long, fnames, workers=workers, use_cache=use_cache)
+
+def build_validation_report(scanned, fail_fast=False):
     records = []
-    for fname in os.listdir(data_directory):
-        if 'trial' in fname.lower():
+    participant_files = {}
+    for fname, row, issues in scanned:
+        match = FILENAME_PATTERN.match(fname)
+        if match:
+            participant_files.setdefault(match.group(1), set()).add(match.group(2))
+        pid = issue_pid(fname, row)
+        records.extend((fname, pid, issue, message) for issue, message in issues)
+
+    # Every participant needs exactly one set of the three modes
+    valid_participants = 0
+    for pid, modes in participant_files.items():
+        missing = EXPECTED_MODES - modes
+        extra = modes - EXPECTED_MODES
+        if len(modes) == 3 and not missing and not extra:
+            valid_participants += 1
             continue
-        if fname.endswith('.json'):
-            fpath = os.path.join(data_directory, fname)
-            with open(fpath, 'r') as f:
-                data = json.load(f)
-                round_data = data.get('round_data', {})
-                t_val = round_data.get('t')
-                mse_val = round_data.get('mse')
-                record = {
-                    'participantID': str(round_data.get('id', '')),
-                    'condition': str(round_data.get('mode', '')),
-                    'time': float(t_val) if t_val is not None else float('nan'),
-                    'error': float(mse_val) if mse_val is not None else float('nan')
-                }
-                records.append(record)
-    df_long = pd.DataFrame(records, columns=['participantID', 'condition', 'time', 'error'])
-    df_long = attach_trial_id(data_dir, df_long)
+        message = f"Participant {pid} has files for modes: {sorted(modes)}"
+        if missing:
+            message += f"\n  Missing modes: {sorted(missing)}"
+        if extra:
+            message += f"\n  Extra/invalid modes: {sorted(extra)}"
+        if fail_fast:
+            raise IntegrityIssue(None, pid, 'incomplete_modes', message)
+        records.append((None, pid, 'incomplete_modes', message))
+
+    return {
+        'issues': pd.DataFrame(records, columns=ISSUE_COLUMNS),
+        'files_checked': len(scanned),
+        'valid_participants': valid_participants
+    }
+
+def validation_report_to_json(report):
+    return json.dumps({
+        'files_checked': report['files_checked'],
+        'valid_participants': report['valid_participants'],
+        'issues': report['issues'].to_dict(orient='records')
+    }, indent=2)
+
+@instrumented
+def validate_and_parse(data_dir=os.path.join(os.getcwd(), 'data'), workers=None, use_processes=False, use_cache=True, fail_fast=False, attach_trial=True, trajectories=False, include_trial_logs=False):
+    # One pass over the logs yields both the integrity report and the long table
+    packed = packed_source(data_dir)
+    if packed:
+        scanned = scan_packed(data_dir, fail_fast=fail_fast)
+    else:
+        scanned = scan_logs(data_dir, workers=workers, use_processes=use_processes, use_cache=use_cache, fail_fast=fail_fast, include_trial_logs=include_trial_logs)
+    report = build_validation_report(scanned, fail_fast=fail_fast)
+    kept = [(fname, row) for fname, row, _ in scanned if row is not None]
+    df_long = build_long_table(row for _, row in kept)
+    if trajectories:
+        df_long = trajectory_measures_for(data_dir, df_long, [fname for fname, _ in kept], packed, workers, use_cache)
+    if attach_trial:
+        df_long = attach_trial_id(data_dir, df_long)
+    return df_long, report
+
+@instrumented
+def parse_data(data_dir=os.path.join(os.getcwd(), 'data'), workers=None, use_processes=False, use_cache=True, participants=None, trajectories=False):
+    # Reads data/json_logs/ or, without it, a packed dataset; participants optionally
+    # restricts the table to these participantIDs (as stored in round_data.id).
+    # trajectories adds the per-log trajectory aggregates as extra measures
+    packed = packed_source(data_dir)
+    if packed:
+        unreadable = packed_dataset.read_packed(*packed, columns=['file'], readable=False).column('file').to_pylist()
+        df_long = load_packed_long_table(data_dir, participants=participants)
+        if trajectories:
+            df_long = trajectory_measures_for(data_dir, df_long, None, packed, workers, use_cache)
+    else:
+        scanned = scan_logs(data_dir, workers=workers, use_processes=use_processes, use_cache=use_cache)
+        unreadable = [fname for fname, row, _ in scanned if row is None]
+        kept = [(fname, row) for fname, row, _ in scanned if row is not None]
+        if participants is not None:
+            wanted = {str(pid) for pid in participants}
+            kept = [(fname, row) for fname, row in kept if row[0] in wanted]
+        df_long = build_long_table(row for _, row in kept)
+        if trajectories:
+            df_long = trajectory_measures_for(data_dir, df_long, [fname for fname, _ in kept], packed, workers, use_cache)
+    if unreadable:
+        print(f"Warning: skipped unreadable log files: {sorted(unreadable)}")
+    # Participants left out on purpose are not reported as missing
+    df_long = attach_trial_id(data_dir, df_long, report=participants is None)
     return df_long
 
-def attach_trial_id(data_dir, df_long):
-    order_path = os.path.join(data_dir, 'other', 'order.xlsx')
-    order_df = pd.read_excel(order_path, skiprows=1)
-
-    # Ensure participantID is zero-padded strings in both dataframes
-    order_df['participantID'] = order_df['participantID'].apply(lambda x: str(x).zfill(2))
-    df_long['participantID'] = df_long['participantID'].apply(lambda x: str(x).zfill(2))
-
-    # Build mapping: participantID -> {mode: trial_number}
-    order_map = {}
-    for _, row in order_df.iterrows():
-        pid = str(row['participantID'])
-        mode_to_trial = {}
-        for i, cond_col in enumerate(['condA', 'condB', 'condC'], 1):
-            val = row[cond_col]
-            if pd.notna(val):
-                mode_to_trial[str(int(val))] = i
-        order_map[pid] = mode_to_trial
-
-    trial_id_list = []
-    for idx, row in df_long.iterrows():
-        pid = str(row['participantID'])
-        try:
-            cond = str(int(float(row['condition'])))
-        except Exception:
-            cond = str(row['condition'])
-        trial_id = order_map.get(pid, {}).get(cond, None)
-        trial_id_list.append(trial_id)
-    df_long['trialID'] = pd.Series(trial_id_list, dtype="Int64")
-    
+def zero_pad_ids(ids):
+    # Pad only the categories of categorical columns instead of every row
+    if isinstance(ids.dtype, pd.CategoricalDtype):
+        mapping = {c: str(c).zfill(2) for c in ids.cat.categories}
+        dtype = pd.CategoricalDtype(sorted(set(mapping.values())), ordered=ids.cat.ordered)
+        return ids.map(mapping).astype(dtype)
+    return ids.astype(str).str.zfill(2)
+
+def normalize_conditions(conditions):
+    # '1', '1.0' and 1 all map to '1'; anything non-numeric is kept as its string form
+    values = pd.Series(pd.unique(conditions.dropna()))
+    numeric = pd.to_numeric(values, errors='coerce')
+    normalized = values.astype(str).where(numeric.isna(), numeric.round().astype('Int64').astype(str))
+    return conditions.map(dict(zip(values, normalized)))
+
+def melt_order_table(order_df):
+    # (participantID, condA, condB, condC) -> one (participantID, condition, trialID) row per trial
+    order_long = order_df.melt(
+        id_vars='participantID',
+        value_vars=ORDER_COLUMNS,
+        var_name='slot',
+        value_name='condition'
+    ).dropna(subset=['condition'])
+    order_long['trialID'] = order_long['slot'].map({col: i for i, col in enumerate(ORDER_COLUMNS, 1)})
+    order_long['condition'] = pd.to_numeric(order_long['condition']).astype('int64').astype(str)
+    # Later rows for the same participant override earlier ones
+    order_long = order_long.drop_duplicates(subset=['participantID', 'condition'], keep='last')
+    return order_long[['participantID', 'condition', 'trialID']]
+
+def order_path(data_dir):
+    return os.path.join(data_dir, 'other', 'order.xlsx')
+
+# order.xlsx path -> (mtime_ns, table); reading the workbook dominates attach_trial_id
+ORDER_TABLES = {}
+
+def read_order_table(data_dir):
+    # The returned table is shared between calls and must not be modified.
+    # Without other/order.xlsx the order table stored in a packed dataset is used
+    path = order_path(data_dir)
+    packed = None if os.path.exists(path) else packed_dataset.find_packed(data_dir)
+    if packed:
+        path = packed[0]
+    mtime_ns = os.stat(path).st_mtime_ns
+    cached = ORDER_TABLES.get(path)
+    if cached is None or cached[0] != mtime_ns:
+        order_df = packed_dataset.read_packed_order(*packed) if packed else pd.read_excel(path, skiprows=1)
+        order_df['participantID'] = zero_pad_ids(order_df['participantID'])
+        ORDER_TABLES[path] = (mtime_ns, order_df)
+    return ORDER_TABLES[path][1]
+
+def report_order_coverage(df_long, order_df):
     # Warn about missing participants
-    data_pids = set(df_long['participantID'])
-    order_pids = set(order_map.keys())
+    data_pids = set(df_long['participantID'].unique())
+    order_pids = set(order_df['participantID'])
     missing_in_order = data_pids - order_pids
     if missing_in_order:
         print(f"Warning: These participantIDs are in your data but not in the order file: {sorted(missing_in_order)}")
@@ -65,8 +365,96 @@ def attach_trial_id(data_dir, df_long):
     if extra_in_order:
         print(f"Note: These participantIDs are in the order file but not in your data: {sorted(extra_in_order)}")
 
+@instrumented
+def attach_trial_id(data_dir, df_long, report=True):
+    # report=False skips the participant coverage warnings (used for partial tables)
+    order_df = read_order_table(data_dir)
+
+    # Ensure participantID is zero-padded strings in both dataframes; df_long itself is not modified
+    df_long = df_long.assign(participantID=zero_pad_ids(df_long['participantID']))
+    order_long = melt_order_table(order_df)
+
+    # Series (not arrays) so that categorical key columns stay categorical
+    keys = pd.DataFrame({
+        'participantID': df_long['participantID'].reset_index(drop=True),
+        'condition': normalize_conditions(df_long['condition']).reset_index(drop=True)
+    })
+    # Join on category codes when the long table is categorical; order entries
+    # outside the categories cannot match any row and are dropped
+    for col in ['participantID', 'condition']:
+        if isinstance(keys[col].dtype, pd.CategoricalDtype):
+            order_long[col] = order_long[col].astype(keys[col].dtype)
+            order_long = order_long[order_long[col].notna()]
+    # A left merge keeps the row order of df_long
+    joined = keys.merge(order_long, how='left', on=['participantID', 'condition'], validate='many_to_one')
+    # trialID is an ordered categorical over TRIAL_IDS; rows without an order entry get code -1 (NaN)
+    codes = joined['trialID'].fillna(0).to_numpy(dtype='int8') - 1
+    df_long = df_long.assign(trialID=pd.Categorical.from_codes(codes, categories=TRIAL_IDS, ordered=True))
+
+    if report:
+        report_order_coverage(df_long, order_df)
     return df_long
 
+def concat_long_tables(df_a, df_b):
+    # Row-wise concat that keeps the compact schema: categoricals are recoded onto the
+    # sorted union of both category sets instead of falling back to object columns
+    columns = {}
+    for col in df_a.columns:
+        if isinstance(df_a[col].dtype, pd.CategoricalDtype):
+            categories = df_a[col].cat.categories.union(df_b[col].cat.categories)
+            dtype = pd.CategoricalDtype(categories, ordered=df_a[col].cat.ordered)
+            columns[col] = pd.concat([df_a[col].astype(dtype), df_b[col].astype(dtype)], ignore_index=True)
+        else:
+            columns[col] = pd.concat([df_a[col], df_b[col]], ignore_index=True)
+    return pd.DataFrame(columns)
+
+@instrumented
+def update_long_table(data_dir, state=None, workers=None, use_processes=False, use_cache=True, trajectories=False):
+    # Watch mode: the ingest cache and the long table stay in memory between calls.
+    # When log files were only added (and order.xlsx is unchanged) their rows are
+    # appended to the previous table; a changed or deleted file rebuilds it from the
+    # cached rows. Returns (df_long, state); df_long is the previous object when
+    # nothing changed, so downstream memoization sees identical content.
+    if state is None:
+        state = {
+            'cache': ingest_cache.load_ingest_cache(data_dir) if use_cache else {},
+            'rows': {},
+            'unreadable': set(),
+            'order_mtime': None,
+            'df_long': None
+        }
+    scanned = scan_logs(data_dir, workers=workers, use_processes=use_processes, use_cache=use_cache, cache=state['cache'])
+    rows = {fname: row for fname, row, _ in scanned if row is not None}
+    unreadable = {fname for fname, row, _ in scanned if row is None}
+    if unreadable - state['unreadable']:
+        print(f"Warning: skipped unreadable log files: {sorted(unreadable - state['unreadable'])}")
+    order_mtime = os.stat(order_path(data_dir)).st_mtime_ns
+
+    previous = state['rows']
+    # Unchanged files keep the very same row tuple in the cache, so identity settles most comparisons
+    appended_only = (
+        state['df_long'] is not None
+        and order_mtime == state['order_mtime']
+        and all(rows.get(fname) == row for fname, row in previous.items())
+    )
+    if not appended_only:
+        df_long = build_long_table(rows.values())
+        if trajectories:
+            df_long = add_trajectory_measures(data_dir, df_long, list(rows), workers=workers, use_cache=use_cache)
+        df_long = attach_trial_id(data_dir, df_long)
+    else:
+        df_long = state['df_long']
+        new_files = [fname for fname in rows if fname not in previous]
+        if new_files:
+            new_part = build_long_table(rows[fname] for fname in new_files)
+            if trajectories:
+                new_part = add_trajectory_measures(data_dir, new_part, new_files, workers=workers, use_cache=use_cache)
+            new_part = attach_trial_id(data_dir, new_part, report=False)
+            df_long = concat_long_tables(df_long, new_part)
+            report_order_coverage(df_long, read_order_table(data_dir))
+    state.update(rows=rows, unreadable=unreadable, order_mtime=order_mtime, df_long=df_long, scanned=scanned)
+    return df_long, state
+
 if __name__ == "__main__":
     df_long = parse_data()
     with pd.option_context('display.max_rows', None, 'display.max_columns', None):
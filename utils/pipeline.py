@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from utils import instrument
+from utils.cache_utils import cache_dir, hash_object, code_fingerprint, load_pickle, save_pickle
+
+# Minimal DAG runner for the analysis script. Each stage declares the named
+# values it reads and writes; results are memoized in data/cache/pipeline/
+# keyed by a hash of the stage function, the content of its inputs and the
+# code and library versions it runs with (cache_utils.code_fingerprint).
+
+# Input name a stage can declare to be told whether this run forces it (--force), e.g. to
+# bypass caches of its own. It is not part of the memo key
+FORCED = 'forced'
+
+def stage(name, func, inputs=(), outputs=(), memoize=True, files=()):
+    # files: outputs holding paths that must still exist for a memoized result to be reused
+    return {
+        'name': name,
+        'func': func,
+        'inputs': list(inputs),
+        'outputs': list(outputs),
+        'memoize': memoize,
+        'files': list(files)
+    }
+
+def memo_path(data_dir, name):
+    return os.path.join(cache_dir(data_dir), 'pipeline', f'{name}.pkl')
+
+def load_memo(data_dir, spec, key):
+    memo = load_pickle(memo_path(data_dir, spec['name']))
+    if memo is None or memo.get('key') != key:
+        return None
+    if not all(os.path.exists(memo['outputs'][name]) for name in spec['files']):
+        return None
+    return memo['outputs']
+
+def save_memo(data_dir, spec, key, outputs):
+    save_pickle(memo_path(data_dir, spec['name']), {'key': key, 'outputs': outputs})
+
+def resolve_stages(stages, only=None):
+    # Stages to run: the selected ones plus everything upstream of them
+    producers = {out: spec for spec in stages for out in spec['outputs']}
+    if not only:
+        return [spec['name'] for spec in stages]
+    unknown = set(only) - {spec['name'] for spec in stages}
+    if unknown:
+        raise ValueError(f"Unknown pipeline stages: {sorted(unknown)}")
+    needed = set()
+    todo = list(only)
+    while todo:
+        name = todo.pop()
+        if name in needed:
+            continue
+        needed.add(name)
+        spec = next(s for s in stages if s['name'] == name)
+        todo.extend(producers[i]['name'] for i in spec['inputs'] if i in producers)
+    return [spec['name'] for spec in stages if spec['name'] in needed]
+
+def run_stage(spec, inputs, input_hashes, data_dir, force, tag='[pipeline]'):
+    start = time.perf_counter()
+    key = hash_object(spec['name'], spec['func'], code_fingerprint(), input_hashes)
+    if spec['memoize'] and not force:
+        outputs = load_memo(data_dir, spec, key)
+        if outputs is not None:
+            # One write per line so concurrent stages do not interleave their output
+            print(f"{tag} {spec['name']}: reused cached result\n", end='')
+            return outputs
+    if FORCED in spec['inputs']:
+        inputs = {**inputs, FORCED: force}
+    with instrument.measure(spec['name'], kind='stage', rows=instrument.rows_of(*inputs.values())) as record:
+        outputs = spec['func'](**inputs)
+        if record.get('rows') is None:
+            record['rows'] = instrument.rows_of(outputs)
+    missing = set(spec['outputs']) - set(outputs)
+    if missing:
+        raise ValueError(f"Stage '{spec['name']}' did not produce {sorted(missing)}")
+    if spec['memoize']:
+        save_memo(data_dir, spec, key, outputs)
+    print(f"{tag} {spec['name']}: done in {time.perf_counter() - start:.2f} s\n", end='')
+    return outputs
+
+COPY_ON_WRITE = {'lock': threading.Lock(), 'depth': 0, 'previous': None}
+
+@contextmanager
+def copy_on_write():
+    # Stages share one read-only df_long; with pandas copy-on-write, frames derived from it
+    # neither duplicate its data nor write into it. The option is global, so it is turned
+    # on while at least one pipeline runs (batch runs several at once) and restored after
+    with COPY_ON_WRITE['lock']:
+        if COPY_ON_WRITE['depth'] == 0:
+            COPY_ON_WRITE['previous'] = pd.get_option('mode.copy_on_write')
+            pd.set_option('mode.copy_on_write', True)
+        COPY_ON_WRITE['depth'] += 1
+    try:
+        yield
+    finally:
+        with COPY_ON_WRITE['lock']:
+            COPY_ON_WRITE['depth'] -= 1
+            if COPY_ON_WRITE['depth'] == 0:
+                pd.set_option('mode.copy_on_write', COPY_ON_WRITE['previous'])
+
+def run_pipeline(stages, context, data_dir, only=None, force=None, workers=None, label=None):
+    # context: initial named values; force: stage names (or 'all') that ignore memoized results;
+    # label: shown in the progress lines, to tell apart pipelines running at the same time.
+    # A stage whose outputs are all supplied by context (e.g. df_long in watch mode) is not run.
+    force = set(force or [])
+    tag = '[pipeline]' if label is None else f'[pipeline {label}]'
+    by_name = {spec['name']: spec for spec in stages}
+    selected = [
+        name for name in resolve_stages(stages, only)
+        if not (by_name[name]['outputs'] and all(out in context for out in by_name[name]['outputs']))
+    ]
+    values = dict(context)
+    value_hashes = {name: hash_object(value) for name, value in values.items()}
+
+    remaining = list(selected)
+    running = {}
+    # Profiled stages run one at a time, so that each profile covers a single stage
+    with copy_on_write(), ThreadPoolExecutor(max_workers=1 if instrument.is_profiling() else workers) as executor:
+        while remaining or running:
+            # Start every stage whose inputs are available; independent stages run concurrently
+            for name in list(remaining):
+                spec = by_name[name]
+                names = [i for i in spec['inputs'] if i != FORCED]
+                if all(i in values for i in names):
+                    remaining.remove(name)
+                    inputs = {i: values[i] for i in names}
+                    input_hashes = [value_hashes[i] for i in names]
+                    future = executor.submit(run_stage, spec, inputs, input_hashes, data_dir, 'all' in force or name in force, tag)
+                    running[future] = spec
+            if not running:
+                raise ValueError(f"Pipeline stages with unsatisfiable inputs: {remaining}")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                spec = running.pop(future)
+                outputs = future.result()
+                for out in spec['outputs']:
+                    values[out] = outputs[out]
+                    value_hashes[out] = hash_object(outputs[out])
+    return values
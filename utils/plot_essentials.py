@@ -1,21 +1,44 @@
 import os
-import seaborn as sns
-import matplotlib.pyplot as plt
-from statannotations.Annotator import Annotator
+import numpy as np
+from utils.lazy_import import lazy_import
+from utils.instrument import instrumented
+from utils.cache_utils import atomic_path
+from utils import figure_templates
 
-def boxplot(data, measure, config, data_dir, annotations_dict=None, unique_id=0):
-    order = config.get('order', ['0', '1', '2'])
-    title = config.get('title', f'Boxplot of {measure}')
+sns = lazy_import('seaborn')
+plt = lazy_import('matplotlib.pyplot')
+mpl_path = lazy_import('matplotlib.path')
+cbook = lazy_import('matplotlib.cbook')
+annotator_lib = lazy_import('statannotations.Annotator')
+
+FILE_EXTENSIONS = {'jpeg': 'jpg', 'jpg': 'jpg', 'png': 'png', 'svg': 'svg'}
+
+@instrumented
+def save_figure(directory, file_title, config, default_format='jpeg', default_dpi=600, fig=None):
+    # fig: the figure to save, by default pyplot's current figure
+    fmt = config.get('format', default_format)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, f'{file_title}.{FILE_EXTENSIONS.get(fmt, fmt)}')
+    # Replaced in one step so a viewer never shows a half-written figure
+    with atomic_path(path) as tmp_path:
+        (fig or plt.gcf()).savefig(tmp_path, format=fmt, dpi=config.get('dpi', default_dpi))
+    return path
+
+def condition_values(data, measure, order):
+    # Non-missing values of each condition in order (empty where a condition has no data)
+    grouped = {str(cond): values.dropna().to_numpy() for cond, values in data.groupby('condition', observed=True)[measure]}
+    return [grouped.get(cond, np.empty(0)) for cond in order]
+
+def build_boxplot_template(data, measure, config, order):
     x_label = config.get('x_label', measure)
     y_label = config.get('y_label', 'Condition')
     palette = config.get('palette', 'Set2')
     y_lim = config.get('y_lim', None)
 
-    file_title = title.replace(" ", "_") + "_" + str(unique_id)
-    directory = os.path.join(data_dir, 'plots')
-
-    plt.figure(figsize=(10, 6))
-    ax = sns.boxplot(
+    fig = figure_templates.new_figure((10, 6))
+    ax = fig.add_subplot()
+    sns.boxplot(
         data=data,
         x=measure,
         y='condition',
@@ -23,8 +46,10 @@ def boxplot(data, measure, config, data_dir, annotations_dict=None, unique_id=0)
         orient='h',
         whis=[0, 100],
         flierprops={"marker": "x", "markersize": 5},
-        order=order
+        order=order,
+        ax=ax
     )
+    n_boxes = len(ax.collections)
     sns.stripplot(
         data=data,
         x=measure,
@@ -37,69 +62,137 @@ def boxplot(data, measure, config, data_dir, annotations_dict=None, unique_id=0)
         ax=ax,
         order=order
     )
+    ax.set_title(config.get('title', f'Boxplot of {measure}'))
+    ax.set_xlabel(x_label)
+    ax.set_ylabel(y_label)
+    if y_lim:
+        ax.set_xlim(y_lim)
+    if 'condition_labels' in config:
+        ax.set_yticks(ax.get_yticks())
+        ax.set_yticklabels([config['condition_labels'].get(str(l), str(l)) for l in ax.get_yticks()])
+
+    # Artists of each condition, keyed by its position on the (categorical) y axis
+    boxes = {}
+    for container in ax.containers:
+        for i, box in enumerate(container.boxes):
+            position = int(round(box.get_path().vertices[:, 1].mean()))
+            boxes[position] = {
+                'box': box,
+                'median': container.medians[i],
+                'whiskers': container.whiskers[2 * i:2 * i + 2],
+                'caps': container.caps[2 * i:2 * i + 2],
+                'fliers': container.fliers[i] if container.fliers else None
+            }
+    strips = {}
+    for collection in ax.collections[n_boxes:]:
+        offsets = collection.get_offsets()
+        if len(offsets):
+            strips[int(round(np.mean(offsets[:, 1])))] = collection
+    template = {'fig': fig, 'ax': ax, 'boxes': boxes, 'strips': strips}
+    figure_templates.fit_layout(template)
+    return template
 
-    # statannotations
+def update_boxplot(template, values):
+    # Same statistics (whiskers at min/max) and strip jitter as seaborn
+    ax = template['ax']
+    for position, artists in template['boxes'].items():
+        stats = cbook.boxplot_stats([values[position]], whis=(0, 100))[0]
+        # A new rectangle from q1 to q3 over the height of the current box
+        y = artists['box'].get_path().vertices[:, 1]
+        artists['box'].set_path(mpl_path.Path(
+            [(stats['q1'], y.min()), (stats['q1'], y.max()), (stats['q3'], y.max()), (stats['q3'], y.min()), (stats['q1'], y.min())],
+            closed=True
+        ))
+        artists['median'].set_xdata([stats['med'], stats['med']])
+        artists['whiskers'][0].set_xdata([stats['q1'], stats['whislo']])
+        artists['whiskers'][1].set_xdata([stats['q3'], stats['whishi']])
+        artists['caps'][0].set_xdata([stats['whislo'], stats['whislo']])
+        artists['caps'][1].set_xdata([stats['whishi'], stats['whishi']])
+        if artists['fliers'] is not None:
+            artists['fliers'].set_data(stats['fliers'], np.full(len(stats['fliers']), position))
+    for position, collection in template['strips'].items():
+        x = values[position]
+        jitter = np.random.uniform(-0.1, 0.1, size=len(x)) if len(x) > 1 else 0
+        collection.set_offsets(np.column_stack([x, position + jitter]))
+    # The condition axis keeps its categorical limits
+    figure_templates.rescale(ax, scaley=False)
+
+@instrumented
+def boxplot(data, measure, config, data_dir, annotations_dict=None, unique_id=0):
+    order = config.get('order', ['0', '1', '2'])
+    title = config.get('title', f'Boxplot of {measure}')
+
+    file_title = title.replace(" ", "_") + "_" + str(unique_id)
+    directory = os.path.join(data_dir, 'plots')
+
+    # One template per config and set of conditions present; only the data changes between figures
+    values = condition_values(data, measure, order)
+    present = tuple(cond for cond, v in zip(order, values) if len(v))
+    key = figure_templates.template_key('boxplot', measure, config, present)
+    template, built = figure_templates.get_template(key, lambda: build_boxplot_template(data, measure, config, order))
+    if not built:
+        update_boxplot(template, values)
+    ax = template['ax']
+
+    # statannotations; its artists and axis limits are removed again after saving
+    before = set(ax.get_children())
+    limits, autoscale = ax.get_xlim(), ax.get_autoscalex_on()
     if annotations_dict and hasattr(ax, 'annotate'):
         present_conditions = set(data['condition'].unique())
-        pairs = [p for p in annotations_dict.keys() 
-                 if p[0] in present_conditions
-                 and p[1] in present_conditions
-                 and annotations_dict[p] != 'ns'
-                 ]
-        annotations = [annotations_dict[p] for p in pairs]
+        # One pass over the lookup collects the significant pairs and their labels
+        significant = [
+            (pair, label) for pair, label in annotations_dict.items()
+            if label != 'ns' and pair[0] in present_conditions and pair[1] in present_conditions
+        ]
+        pairs = [pair for pair, _ in significant]
+        annotations = [label for _, label in significant]
         if pairs:
-            annotator = Annotator(ax, pairs, data=data, x=measure, y='condition', order=order, orient='h')
+            annotator = annotator_lib.Annotator(ax, pairs, data=data, x=measure, y='condition', order=order, orient='h')
             annotator.configure(test=None, text_format='star')
             annotator.set_custom_annotations(annotations)
             annotator.annotate()
-
-    ax.set_title(title)
-    ax.set_xlabel(x_label)
-    ax.set_ylabel(y_label)
-    if y_lim:
-        ax.set_xlim(y_lim)
-
-    if 'condition_labels' in config:
-        ax.set_yticklabels([config['condition_labels'].get(str(l), str(l)) for l in ax.get_yticks()])
-    plt.tight_layout()
+    figure_templates.fit_layout(template)
 
     # Save plot
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-    plt.savefig(f'{directory}/{file_title}.jpg', format='jpeg', dpi=600)
-    plt.close()
+    try:
+        path = save_figure(directory, file_title, config, fig=template['fig'])
+    finally:
+        for artist in figure_templates.added_artists(ax, before):
+            artist.remove()
+        ax.set_xlim(limits)
+        ax.set_autoscalex_on(autoscale)
+    return path
 
-def plot_learning_curve(data, measure, data_dir, config, unique_id=0):
-    order = config.get('order', ['0', '1', '2'])
-    title = config.get('title', f'Learning Curve: {measure}')
+def trial_numbers(data):
+    # trialID is an ordered categorical; its numeric value without re-casting the column
+    return data['trialID'].cat.categories.to_numpy()[data['trialID'].cat.codes.to_numpy()]
+
+def build_learning_curve_template(data, trial, measure, config, order):
     y_label = config.get('y_label', measure)
     x_label = config.get('x_label', 'Trial')
     palette = config.get('palette', 'Set2')
-    invert_yaxis = config.get('invert_yaxis', False)
-    file_title = title.replace(" ", "_") + "_" + str(unique_id)
-    directory = os.path.join(data_dir, 'plots')
-
-    data = data.copy()
-    data = data[data['trialID'].notna()]
-    data['trialID'] = data['trialID'].astype(int)
 
-    plt.figure(figsize=(8, 5))
-    ax = sns.lineplot(
+    fig = figure_templates.new_figure((8, 5))
+    ax = fig.add_subplot()
+    sns.lineplot(
         data=data,
-        x='trialID',
+        x=trial,
         y=measure,
         marker='o',
         hue='condition',
         palette=palette,
-        errorbar='se'
+        errorbar='se',
+        ax=ax
     )
-    plt.title(title)
-    plt.xlabel(x_label)
-    plt.ylabel(y_label)
-    plt.xticks([1, 2, 3])
-    if invert_yaxis:
-        plt.gca().invert_yaxis()
-    plt.tight_layout()
+    # Lines and bands are drawn per condition; the legend adds empty lines after them
+    lines = [line for line in ax.lines if len(line.get_xdata())]
+    bands = list(ax.collections)
+    ax.set_title(config.get('title', f'Learning Curve: {measure}'))
+    ax.set_xlabel(x_label)
+    ax.set_ylabel(y_label)
+    ax.set_xticks([1, 2, 3])
+    if config.get('invert_yaxis', False):
+        ax.invert_yaxis()
 
     if 'condition_labels' in config:
         handles, labels = ax.get_legend_handles_labels()
@@ -109,8 +202,56 @@ def plot_learning_curve(data, measure, data_dir, config, unique_id=0):
         ordered_handles = [label_to_handle[o] for o in order if o in label_to_handle]
         ordered_labels = [config['condition_labels'].get(o, o) for o in order if o in label_to_handle]
         ax.legend(ordered_handles, ordered_labels, title='condition')
+    template = {'fig': fig, 'ax': ax, 'lines': lines, 'bands': bands}
+    figure_templates.fit_layout(template)
+    return template
 
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-    plt.savefig(f'{directory}/{file_title}.jpg', format='jpeg', dpi=600)
-    plt.close()
+def update_band(ax, band, x, low, high):
+    # fill_between bands can be updated in place from matplotlib 3.10; before that the
+    # band is drawn again with the same style. Returns the band now on the axes
+    if hasattr(band, 'set_data'):
+        band.set_data(x, low, high)
+        return band
+    replacement = ax.fill_between(
+        x, low, high, facecolor=band.get_facecolor(), edgecolor=band.get_edgecolor(),
+        linewidth=band.get_linewidth(), zorder=band.get_zorder(), label=band.get_label()
+    )
+    band.remove()
+    return replacement
+
+def update_learning_curve(template, data, trial, measure, levels):
+    # Mean and standard error per trial, as seaborn's lineplot(errorbar='se')
+    frame = data[['condition']].assign(trial=trial, value=data[measure].to_numpy())
+    grouped = frame.groupby(['condition', 'trial'], observed=True)['value']
+    summary = grouped.mean().to_frame('mean').assign(se=grouped.sem())
+    points = []
+    for i, (level, line, band) in enumerate(zip(levels, template['lines'], template['bands'])):
+        rows = summary.loc[level].sort_index()
+        x, mean, se = rows.index.to_numpy(dtype=float), rows['mean'].to_numpy(), rows['se'].to_numpy()
+        line.set_data(x, mean)
+        template['bands'][i] = update_band(template['ax'], band, x, mean - se, mean + se)
+        points += [np.column_stack([x, mean - se]), np.column_stack([x, mean + se])]
+    figure_templates.rescale(template['ax'], points=points)
+
+@instrumented
+def plot_learning_curve(data, measure, data_dir, config, unique_id=0):
+    order = config.get('order', ['0', '1', '2'])
+    title = config.get('title', f'Learning Curve: {measure}')
+    file_title = title.replace(" ", "_") + "_" + str(unique_id)
+    directory = os.path.join(data_dir, 'plots')
+
+    if data['trialID'].isna().any():
+        data = data[data['trialID'].notna()]
+    data = data[data[measure].notna()]
+    trial = trial_numbers(data)
+
+    # One line and band per condition with data, in the order of the condition categories
+    present = set(data['condition'].astype(str))
+    levels = [cond for cond in data['condition'].cat.categories if str(cond) in present]
+    key = figure_templates.template_key('learning_curve', measure, config, levels)
+    template, built = figure_templates.get_template(key, lambda: build_learning_curve_template(data, trial, measure, config, order))
+    if not built:
+        update_learning_curve(template, data, trial, measure, levels)
+        figure_templates.fit_layout(template)
+
+    return save_figure(directory, file_title, config, fig=template['fig'])
@@ -0,0 +1,61 @@
+import os
+from utils import instrument, worker_pool
+from utils.cache_utils import cache_dir, hash_object, code_fingerprint, load_json, save_json
+from utils.lazy_import import lazy_import
+
+matplotlib = lazy_import('matplotlib')
+
+# Figures are described as specs (plot function + arguments) and rendered in a
+# process pool on the Agg backend. A manifest in data/cache/ records the hash of
+# every rendered spec so unchanged figures are not drawn again.
+
+def figure_spec(func, *args, **kwargs):
+    return {'func': func, 'args': args, 'kwargs': kwargs}
+
+def spec_hash(spec):
+    # Covers the plot function, the input data, every config value and the plotting code
+    # and library versions, so an edit to plot_essentials or an upgrade redraws the figure
+    return hash_object(spec['func'], spec['args'], spec['kwargs'], code_fingerprint())
+
+def render_manifest_path(data_dir):
+    return os.path.join(cache_dir(data_dir), 'render_manifest.json')
+
+def render_spec(spec):
+    matplotlib.use('Agg')
+    outputs = spec['func'](*spec['args'], **spec['kwargs'])
+    if outputs is None:
+        return []
+    return [outputs] if isinstance(outputs, str) else list(outputs)
+
+def render_figures(specs, data_dir, workers=None, force=False):
+    manifest = load_json(render_manifest_path(data_dir), default={})
+    pending, digests = [], []
+    for spec in specs:
+        digest = spec_hash(spec)
+        outputs = manifest.get(digest)
+        if not force and outputs and all(os.path.exists(p) for p in outputs):
+            continue
+        pending.append(spec)
+        digests.append(digest)
+    if not pending:
+        return manifest
+
+    # A single figure is drawn in this thread, unless a shared pool is open: several
+    # analyses may then be rendering at once and pyplot is not thread-safe
+    if workers == 1 or (len(pending) == 1 and not worker_pool.is_shared()):
+        rendered = list(map(render_spec, pending))
+    else:
+        n = len(pending)
+        with worker_pool.process_pool(workers) as executor:
+            collected = list(executor.map(instrument.call_collected, [instrument.is_enabled()] * n, [render_spec] * n, pending))
+        rendered = [outputs for outputs, _ in collected]
+        for _, records in collected:
+            instrument.add_records(records)
+
+    for digest, outputs in zip(digests, rendered):
+        # Forget older hashes that rendered to the same files
+        for old_digest in [d for d, paths in manifest.items() if set(paths) & set(outputs)]:
+            del manifest[old_digest]
+        manifest[digest] = outputs
+    save_json(render_manifest_path(data_dir), manifest)
+    return manifest
@@ -0,0 +1,103 @@
+import math
+from itertools import permutations
+import numpy as np
+from utils import fast_stats, worker_pool
+
+# Permutation p-values and bootstrap confidence intervals for the repeated-measures
+# tests. Resamples are generated as batched arrays in fixed-size chunks, so memory
+# is bounded by the chunk size and not by the number of resamples. Every chunk gets
+# its own child seed, so results do not depend on the number of workers. Each kind of
+# resampling is given its own child of the user's seed (resampling_seeds), so their random
+# streams are independent.
+
+CHUNK_ELEMENTS = 2_000_000
+
+def resampling_seeds(seed, n):
+    # n independent seeds (permutation, bootstrap, ...) derived from one user seed
+    return np.random.SeedSequence(seed).spawn(n)
+
+def chunk_plan(n_resamples, X, seed):
+    # seed: an int, None or a SeedSequence from resampling_seeds()
+    chunk_size = max(1, CHUNK_ELEMENTS // X.size)
+    starts = list(range(0, n_resamples, chunk_size))
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    seeds = root.spawn(len(starts))
+    return [(start, min(chunk_size, n_resamples - start), child) for start, child in zip(starts, seeds)]
+
+def run_chunks(func, X, plan, workers=None):
+    if workers == 1 or len(plan) == 1:
+        return [func(X, *chunk) for chunk in plan]
+    with worker_pool.process_pool(workers) as executor:
+        futures = [executor.submit(func, X, *chunk) for chunk in plan]
+        return [future.result() for future in futures]
+
+def permutation_orders(start, size, seed, n_participants, n_conditions, exact):
+    if exact:
+        # Enumerate all (k!)^n label assignments: resample index -> one permutation per participant
+        perms = np.array(list(permutations(range(n_conditions))))
+        idx = np.arange(start, start + size)
+        digits = (idx[:, None] // len(perms) ** np.arange(n_participants)) % len(perms)
+        return perms[digits]
+    rng = np.random.default_rng(seed)
+    identity = np.broadcast_to(np.arange(n_conditions), (size, n_participants, n_conditions))
+    return rng.permuted(identity, axis=-1)
+
+def permutation_chunk(X, start, size, seed, exact=False):
+    # X: (measures, participants, conditions); labels are shuffled within each participant
+    orders = permutation_orders(start, size, seed, X.shape[1], X.shape[2], exact)
+    Xp = np.take_along_axis(X[None], orders[:, None, :, :], axis=-1)
+    _, Q, _ = fast_stats.friedman(Xp)
+    _, p_unc = fast_stats.wilcoxon(np.subtract(*fast_stats.split_pairs(Xp)[1:]))
+    return Q, p_unc
+
+def permutation_chunk_exact(X, start, size, seed):
+    return permutation_chunk(X, start, size, seed, exact=True)
+
+def bootstrap_chunk(X, start, size, seed):
+    # Participants are resampled with replacement
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, X.shape[1], (size, X.shape[1]))
+    Xb = np.moveaxis(X[:, idx, :], 1, 0)
+    _, x, y = fast_stats.split_pairs(Xb)
+    return fast_stats.paired_hedges(x, y)
+
+def bootstrap_mean_chunk(X, start, size, seed):
+    # Condition means of resampled participants; missing cells are skipped, as in the group means
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, X.shape[1], (size, X.shape[1]))
+    Xb = np.moveaxis(X[:, idx, :], 1, 0)
+    present = ~np.isnan(Xb)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(present, Xb, 0).sum(axis=-2) / present.sum(axis=-2)
+
+def permutation_test(X, n_resamples, seed=None, workers=None):
+    # Returns Friedman and pairwise permutation p-values, exact when all assignments fit in n_resamples
+    n_assignments = math.factorial(X.shape[2]) ** X.shape[1]
+    exact = n_assignments <= n_resamples
+    n_draws = n_assignments if exact else n_resamples
+    plan = chunk_plan(n_draws, X, seed)
+    chunks = run_chunks(permutation_chunk_exact if exact else permutation_chunk, X, plan, workers)
+    Q_perm = np.concatenate([q for q, _ in chunks])
+    p_perm = np.concatenate([p for _, p in chunks])
+
+    _, Q_obs, _ = fast_stats.friedman(X)
+    _, p_obs = fast_stats.wilcoxon(np.subtract(*fast_stats.split_pairs(X)[1:]))
+    # Small tolerance so the observed assignment counts as at least as extreme as itself
+    q_extreme = (Q_perm >= Q_obs - 1e-9 * np.abs(Q_obs)).sum(axis=0)
+    p_extreme = (p_perm <= p_obs * (1 + 1e-9)).sum(axis=0)
+    if exact:
+        return q_extreme / n_draws, p_extreme / n_draws, True
+    return (q_extreme + 1) / (n_draws + 1), (p_extreme + 1) / (n_draws + 1), False
+
+def bootstrap_ci(X, n_resamples, seed=None, workers=None, ci=0.95):
+    # X: complete cases. Returns percentile CIs of pairwise Hedges' g, (measures, pairs, 2)
+    hedges = np.concatenate(run_chunks(bootstrap_chunk, X, chunk_plan(n_resamples, X, seed), workers))
+    q = [(1 - ci) / 2, 1 - (1 - ci) / 2]
+    return np.moveaxis(np.quantile(hedges, q, axis=0), 0, -1)
+
+def bootstrap_mean_ci(X, n_resamples, seed=None, workers=None, ci=0.95):
+    # X: all participants, NaN where a condition is missing, so the CIs belong to the same rows
+    # as the group means. Returns percentile CIs of the condition means, (measures, conditions, 2)
+    means = np.concatenate(run_chunks(bootstrap_mean_chunk, X, chunk_plan(n_resamples, X, seed), workers))
+    q = [(1 - ci) / 2, 1 - (1 - ci) / 2]
+    return np.moveaxis(np.nanquantile(means, q, axis=0), 0, -1)
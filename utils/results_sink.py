@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import pandas as pd
+from utils.lazy_import import lazy_import
+from utils.instrument import instrumented
+from utils.cache_utils import atomic_path
+from utils.annotations import pair_label
+
+xlsxwriter = lazy_import('xlsxwriter')
+
+# Result tables are collected once as (sheet name, DataFrame) pairs plus a Metadata
+# table and handed to one of the sinks below. Every sink stores the same tables
+# under the same names, so the Metadata 'Sheet' column is valid for all of them.
+# Outputs are written to a temporary file and moved into place, so a reader (or a
+# watch-mode rerun) never sees a half-written file.
+
+RESULT_TABLES = [
+    ('stat_analysis', 'friedman', 'Friedman'),
+    ('results', 'pairwise', 'Pairwise'),
+    ('learning_curve', 'learning_curve', 'Learning Curve'),
+    ('group_stats', 'group_stats', 'Group Stats'),
+    ('normality_res', 'normality_residuals', 'Normality of residuals'),
+    ('normality_cond', 'normality_condition', 'Normality of condition'),
+]
+RESET_INDEX = {'normality_res', 'normality_cond'}
+
+def collect_result_sheets(results_dict):
+    sheets, metadata = [], []
+    for label, result in results_dict.items():
+        for key, suffix, test in RESULT_TABLES:
+            if key in result and isinstance(result[key], pd.DataFrame):
+                # Results are read, never modified
+                table = result[key].reset_index() if key in RESET_INDEX else result[key]
+                if key == 'results' and 'annotations' in result:
+                    # Same significance labels as the boxplot annotations
+                    table = table.assign(significance=[
+                        pair_label(result['annotations'], str(a), str(b)) for a, b in zip(table['A'], table['B'])
+                    ])
+                sheets.append((f"{label}_{suffix}", table))
+                metadata.append({'Label': label, 'Test': test, 'Sheet': f"{label}_{suffix}"})
+    if metadata:
+        sheets.append(("Metadata", pd.DataFrame(metadata)))
+    else:
+        sheets.append(("Empty", pd.DataFrame({'Message': ['No results available']})))
+    return sheets
+
+def write_xlsx(sheets, save_path):
+    with atomic_path(save_path) as tmp_path, pd.ExcelWriter(tmp_path, mode='w') as writer:
+        for name, table in sheets:
+            table.to_excel(writer, sheet_name=name, index=False)
+
+def write_xlsx_stream(sheets, save_path):
+    # xlsxwriter in constant_memory mode flushes each row to disk once the next one starts,
+    # so rows are written strictly in order (pandas' to_excel writes column by column)
+    with atomic_path(save_path) as tmp_path:
+        workbook = xlsxwriter.Workbook(tmp_path, {'constant_memory': True, 'nan_inf_to_errors': True})
+        header = workbook.add_format({'bold': True, 'border': 1, 'align': 'center'})
+        for name, table in sheets:
+            worksheet = workbook.add_worksheet(name)
+            worksheet.write_row(0, 0, [str(col) for col in table.columns], header)
+            # Missing values are left as empty cells, as with to_excel
+            rows = table.astype(object).where(table.notna(), None)
+            for r, row in enumerate(rows.itertuples(index=False), start=1):
+                worksheet.write_row(r, 0, row)
+        workbook.close()
+
+def write_table_dir(sheets, save_dir, fmt):
+    os.makedirs(save_dir, exist_ok=True)
+    written = set()
+    for name, table in sheets:
+        path = os.path.join(save_dir, f'{name}.{fmt}')
+        with atomic_path(path) as tmp_path:
+            if fmt == 'parquet':
+                table.to_parquet(tmp_path, index=False)
+            else:
+                table.to_csv(tmp_path, index=False)
+        written.add(os.path.basename(path))
+    # Tables from a previous run that are no longer produced are removed afterwards
+    for fname in os.listdir(save_dir):
+        if fname.endswith(f'.{fmt}') and fname not in written:
+            os.remove(os.path.join(save_dir, fname))
+
+def write_sqlite(sheets, save_path):
+    with atomic_path(save_path) as tmp_path:
+        with sqlite3.connect(tmp_path) as conn:
+            for name, table in sheets:
+                table.to_sql(name, conn, index=False)
+        conn.close()
+
+# sink name -> (file extension, writer); the directory sinks have no extension
+RESULT_SINKS = {
+    'xlsx': ('.xlsx', write_xlsx),
+    'xlsx-stream': ('.xlsx', write_xlsx_stream),
+    'parquet': ('', lambda sheets, path: write_table_dir(sheets, path, 'parquet')),
+    'csv': ('', lambda sheets, path: write_table_dir(sheets, path, 'csv')),
+    'sqlite': ('.sqlite', write_sqlite),
+}
+
+def write_sheets(sheets, save_dir, name, sink='xlsx'):
+    if sink not in RESULT_SINKS:
+        raise ValueError(f"Unknown results sink '{sink}', expected one of {sorted(RESULT_SINKS)}")
+    extension, writer = RESULT_SINKS[sink]
+    os.makedirs(save_dir, exist_ok=True)
+    save_path = os.path.join(save_dir, name + extension)
+    writer(sheets, save_path)
+    return save_path
+
+def combine_result_sheets(study_sheets):
+    # study_sheets: [(study name, sheets from collect_result_sheets)]. Tables with the same
+    # sheet name are stacked with a leading 'Study' column, so each measure/test can be
+    # compared across studies on one sheet; the Metadata tables are merged
+    tables, metadata = {}, {}
+    for study, sheets in study_sheets:
+        for name, table in sheets:
+            if name == 'Metadata':
+                for row in table.to_dict('records'):
+                    metadata.setdefault(row['Sheet'], row)
+            elif name != 'Empty':
+                tables.setdefault(name, []).append(table.assign(Study=study)[['Study', *table.columns]])
+    combined = [(name, pd.concat(frames, ignore_index=True)) for name, frames in tables.items()]
+    if metadata:
+        combined.append(("Metadata", pd.DataFrame(list(metadata.values()))))
+    return combined
+
+@instrumented
+def save_results(results_dict, data_dir=os.path.join(os.getcwd(), 'data'), sink='xlsx'):
+    return write_sheets(collect_result_sheets(results_dict), os.path.join(data_dir, 'results'), 'results_summary', sink=sink)
@@ -0,0 +1,227 @@
+import warnings
+import numpy as np
+import pandas as pd
+from utils import fast_stats, statistical_tools
+from utils.parse_core import melt_order_table, parallel_map
+from utils.instrument import instrumented
+
+# Leave-one-participant-out and subgroup sensitivity of the repeated-measures tests and the
+# learning-curve models (src/sensitivity_analysis.py). The long table is pivoted once into a
+# participants x conditions matrix per measure and ranked once:
+# - Friedman: the within-participant ranks do not depend on the other participants, so the
+#   rank sums of any subset are the full sums minus the ranks of the participants left out
+#   (or a membership matrix times the ranks, for subgroups).
+# - Wilcoxon: leaving out difference i lowers the rank of every larger |d| by 1 and of every
+#   tied one by 1/2, so all leave-one-out signed-rank sums follow from one sort.
+# - Hedges' g: running sums of the centred values.
+# Subgroup Wilcoxon tests are ranked again (they are few). Mixed models have no shortcut and
+# are refitted in the process pool, warm-started from the full-data estimates. The result is
+# one tidy table with a row per subset, measure, test and term.
+
+STABILITY_COLUMNS = ['analysis', 'subset', 'n', 'measure', 'test', 'term', 'statistic', 'p-unc', 'p-corr', 'effect', 'note']
+
+def order_subgroups(order_df, participants, min_size=5):
+    # {label: participantIDs} by counterbalancing sequence ('order 0-2-1') and by the
+    # condition done first ('first 0'); groups smaller than min_size are left out
+    order_long = melt_order_table(order_df).sort_values(['participantID', 'trialID'])
+    sequences = order_long.groupby('participantID')['condition'].agg('-'.join)
+    sequences = sequences[sequences.index.isin(set(participants))]
+    groups = {}
+    for label, keys in [('order', sequences), ('first', sequences.str.split('-').str[0])]:
+        for value, members in keys.groupby(keys).groups.items():
+            groups[f'{label} {value}'] = list(members)
+    return {label: members for label, members in groups.items() if len(members) >= min_size}
+
+def leave_one_out_friedman(X):
+    # X: (participants, conditions) -> W, Q and p-value with each participant left out, (participants,)
+    ranks, ties = fast_stats.rank_average(X)
+    return fast_stats.friedman_from_rank_sums(ranks.sum(axis=0) - ranks, ties.sum() - ties, X.shape[0] - 1)
+
+def subgroup_friedman(X, members):
+    # members: (groups, participants) boolean membership -> W, Q and p-value per group
+    ranks, ties = fast_stats.rank_average(X)
+    weights = members.astype(np.float64)
+    return fast_stats.friedman_from_rank_sums(weights @ ranks, weights @ ties, members.sum(axis=1))
+
+def leave_one_out_wilcoxon(d):
+    # d: (..., participants) paired differences -> W and p-value with each participant left out,
+    # (..., participants); zero differences are dropped as in fast_stats.wilcoxon
+    n = d.shape[-1]
+    nonzero = d != 0
+    a = np.where(nonzero, np.abs(d), np.nan)
+    order = np.argsort(a, axis=-1, kind='mergesort')
+    start, end = fast_stats.tie_bounds(np.take_along_axis(a, order, axis=-1))
+    ranks = (start + end) / 2 + 1
+    size = end - start + 1
+    positive = np.take_along_axis(d > 0, order, axis=-1)
+    nonzero = np.take_along_axis(nonzero, order, axis=-1)
+
+    # Positive differences at or below each tie group, in sorted order (zeros sort last)
+    cumulative = np.cumsum(positive, axis=-1)
+    up_to_end = np.take_along_axis(cumulative, end, axis=-1)
+    below_start = np.where(start > 0, np.take_along_axis(cumulative, np.maximum(start - 1, 0), axis=-1), 0)
+    greater = cumulative[..., -1:] - up_to_end
+    tied = up_to_end - below_start - positive
+
+    r_plus = np.where(positive, ranks, 0).sum(axis=-1, keepdims=True)
+    ties = (size ** 2 - 1).sum(axis=-1, keepdims=True)
+    loo_r_plus = r_plus - np.where(positive, ranks, 0) - greater - 0.5 * tied
+    loo_count = nonzero.sum(axis=-1, keepdims=True) - nonzero
+    # A tie group of size t contributes t^3 - t; without one of its members that drops by 3t(t - 1)
+    loo_ties = ties - np.where(nonzero, 3 * size * (size - 1), 0)
+    W_sorted, p_sorted = fast_stats.signed_rank_test(loo_r_plus, loo_count, loo_ties, n - 1)
+
+    W, p = np.empty_like(W_sorted), np.empty_like(p_sorted)
+    np.put_along_axis(W, order, W_sorted, axis=-1)
+    np.put_along_axis(p, order, p_sorted, axis=-1)
+    return W, p
+
+def leave_one_out_hedges(x, y):
+    # x, y: (..., participants) -> paired Hedges' g with each participant left out
+    n = x.shape[-1]
+
+    def moments(v):
+        # Centring first keeps the sums of squares accurate
+        center = v.mean(axis=-1, keepdims=True)
+        v = v - center
+        rest = v.sum(axis=-1, keepdims=True) - v
+        mean = rest / (n - 1)
+        var = ((v ** 2).sum(axis=-1, keepdims=True) - v ** 2 - (n - 1) * mean ** 2) / (n - 2)
+        return center + mean, var
+
+    mean_x, var_x = moments(x)
+    mean_y, var_y = moments(y)
+    d = (mean_x - mean_y) / np.sqrt((var_x + var_y) / 2)
+    return d * (1 - (3 / (4 * (2 * (n - 1)) - 9)))
+
+def stability_rows(analysis, subsets, n, measure, test, terms, statistic, p_unc, p_corr, effect, note=None):
+    # Value arrays are (subsets, terms)
+    shape = (len(subsets), len(terms))
+    column = lambda values: np.broadcast_to(np.asarray(values, dtype=np.float64), shape).ravel()
+    return pd.DataFrame({
+        'analysis': analysis,
+        'subset': np.repeat(np.asarray(subsets, dtype=object), len(terms)),
+        'n': np.repeat(np.asarray(n), len(terms)),
+        'measure': measure,
+        'test': test,
+        'term': np.tile(np.asarray(terms, dtype=object), len(subsets)),
+        'statistic': column(statistic),
+        'p-unc': column(p_unc),
+        'p-corr': column(p_corr),
+        'effect': column(effect),
+        'note': note
+    }, columns=STABILITY_COLUMNS)
+
+@instrumented
+def repeated_measures_sensitivity(X, conditions, participants, measure, subgroups):
+    # X: (participants, conditions) complete cases of one measure
+    n = X.shape[0]
+    pairs, x, y = fast_stats.split_pairs(X)
+    pair_terms = [f'{conditions[a]} vs {conditions[b]}' for a, b in pairs]
+    holm = lambda p: fast_stats.holm(p, axis=-1) if len(pairs) > 1 else np.full_like(p, np.nan)
+    frames = []
+
+    W, Q, p = fast_stats.friedman(X)
+    _, w_vals, p_unc, p_corr, hedges = fast_stats.pairwise_wilcoxon(X)
+    frames.append(stability_rows('full', ['all'], [n], measure, 'friedman', ['condition'], Q, p, np.nan, W))
+    frames.append(stability_rows('full', ['all'], [n], measure, 'wilcoxon', pair_terms, w_vals[None], p_unc[None], p_corr[None], hedges[None]))
+
+    if n > 3:
+        W, Q, p = leave_one_out_friedman(X)
+        frames.append(stability_rows('leave_one_out', participants, np.full(n, n - 1), measure, 'friedman', ['condition'], Q[:, None], p[:, None], np.nan, W[:, None]))
+        # (pairs, participants) -> (participants, pairs)
+        w_vals, p_unc = (v.T for v in leave_one_out_wilcoxon(x - y))
+        hedges = leave_one_out_hedges(x, y).T
+        frames.append(stability_rows('leave_one_out', participants, np.full(n, n - 1), measure, 'wilcoxon', pair_terms, w_vals, p_unc, holm(p_unc), hedges))
+
+    if subgroups:
+        labels = list(subgroups)
+        members = np.array([np.isin(participants, subgroups[label]) for label in labels])
+        W, Q, p = subgroup_friedman(X, members)
+        sizes = members.sum(axis=1)
+        frames.append(stability_rows('subgroup', labels, sizes, measure, 'friedman', ['condition'], Q[:, None], p[:, None], np.nan, W[:, None]))
+        for label, mask in zip(labels, members):
+            _, w_vals, p_unc, p_corr, hedges = fast_stats.pairwise_wilcoxon(X[mask])
+            frames.append(stability_rows('subgroup', [label], [mask.sum()], measure, 'wilcoxon', pair_terms, w_vals[None], p_unc[None], p_corr[None], hedges[None]))
+    return frames
+
+def fit_learning_curve(job):
+    # (analysis, subset, measure, frame, start) -> (job key, table or None, packed params, note)
+    analysis, subset, measure, frame, start = job
+    key = (analysis, subset, measure, frame['participantID'].nunique())
+    try:
+        model = statistical_tools.learning_curve_model(frame, measure)
+        if np.linalg.matrix_rank(model.exog) < model.exog.shape[1]:
+            # e.g. a single condition order, where trial and condition are confounded
+            return key, None, None, 'trial and condition confounded'
+        start_params = start[1] if start is not None and start[0] == model.exog_names else None
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results = statistical_tools.fit_mixedlm(model, start_params)
+        params = (model.exog_names, results.params_object.get_packed(use_sqrt=model.use_sqrt, has_fe=True))
+        return key, statistical_tools.mixedlm_table(results), params, None if results.converged else 'not converged'
+    except Exception as e:
+        return key, None, None, f'fit failed: {e!r}'
+
+def learning_curve_rows(outcome):
+    (analysis, subset, measure, n), table, _, note = outcome
+    if table is None:
+        return stability_rows(analysis, [subset], [n], measure, 'mixedlm', [None], np.nan, np.nan, np.nan, np.nan, note=note)
+    fixed = table[table['z'].notna()]
+    return stability_rows(
+        analysis, [subset], [n], measure, 'mixedlm', fixed['variable'].tolist(),
+        fixed['z'].to_numpy()[None], fixed['P>|z|'].to_numpy()[None], np.nan, fixed['Coef.'].to_numpy()[None], note=note
+    )
+
+@instrumented
+def learning_curve_sensitivity(df_long, measures, subgroups, workers=None):
+    # One fit per measure on all participants, then leave-one-out and subgroup refits
+    # started from its estimates, all in the process pool
+    def subset_frame(measure, members):
+        subset = df_long[df_long['participantID'].isin(members)]
+        subset = subset.assign(participantID=subset['participantID'].cat.remove_unused_categories())
+        return statistical_tools.learning_curve_frame(subset, measure)
+
+    full_jobs = [('full', 'all', measure, statistical_tools.learning_curve_frame(df_long, measure), None) for measure in measures]
+    full = list(parallel_map(fit_learning_curve, full_jobs, workers=workers, use_processes=True, chunksize=1))
+    frames = [learning_curve_rows(outcome) for outcome in full]
+
+    jobs = []
+    for measure, (_, _, start, _) in zip(measures, full):
+        participants = list(df_long.loc[df_long[measure].notna(), 'participantID'].unique())
+        for pid in participants:
+            jobs.append(('leave_one_out', pid, measure, [p for p in participants if p != pid], start))
+        for label, members in subgroups.items():
+            jobs.append(('subgroup', label, measure, members, start))
+    # Frames are built as the pool asks for jobs, so they are not all held at once
+    pending = ((analysis, subset, measure, subset_frame(measure, members), start) for analysis, subset, measure, members, start in jobs)
+    frames += [learning_curve_rows(outcome) for outcome in parallel_map(fit_learning_curve, pending, workers=workers, use_processes=True, chunksize=4)]
+    return frames
+
+def add_stability_columns(table, alpha=0.05):
+    # significant: p-corr (p-unc where there is none) <= alpha; flipped: differs from the
+    # full-data result of the same measure, test and term; effect-change: effect minus full
+    p = table['p-corr'].fillna(table['p-unc'])
+    table['significant'] = p <= alpha
+    keys = ['measure', 'test', 'term']
+    full = table.loc[table['analysis'] == 'full', keys + ['significant', 'effect']]
+    reference = table[keys].merge(full, how='left', on=keys, suffixes=('', '_full'))
+    table['flipped'] = (table['significant'].to_numpy() != reference['significant'].to_numpy()) & reference['significant'].notna().to_numpy()
+    table['effect-change'] = table['effect'].to_numpy() - reference['effect'].to_numpy(dtype=np.float64)
+    return table
+
+@instrumented
+def sensitivity_table(df_long, measures, order_df=None, min_subgroup_size=5, learning_curves=True, workers=None, alpha=0.05):
+    measures = list(measures)
+    X_all, conditions, participants = statistical_tools.pivot_measures(df_long, measures)
+    participants = np.asarray([str(pid) for pid in participants], dtype=object)
+    subgroups = order_subgroups(order_df, participants, min_subgroup_size) if order_df is not None else {}
+    frames = []
+    for m, measure in enumerate(measures):
+        # Listwise deletion per measure, as in compute_repeated_measures_batch
+        complete = ~np.isnan(X_all[:, :, m]).any(axis=1)
+        frames += repeated_measures_sensitivity(X_all[complete, :, m], conditions, participants[complete], measure, subgroups)
+    if learning_curves:
+        frames += learning_curve_sensitivity(df_long, measures, subgroups, workers=workers)
+    table = pd.concat(frames, ignore_index=True)
+    return add_stability_columns(table, alpha=alpha)
@@ -1,12 +1,19 @@
 import os
+import numpy as np
 import pandas as pd
-import pingouin as pg
-import matplotlib.pyplot as plt
-import scipy.stats as stats
-from statsmodels.formula.api import ols
-from cfg.plot_config import condition_labels
-import statsmodels.formula.api as smf
+from cfg.plot_config import condition_labels, qq_plot_config
+from utils import fast_stats, resampling, results_sink, instrument, worker_pool, figure_templates
+from utils.cache_utils import cache_dir, hash_object, code_fingerprint, load_pickle, save_pickle
+from utils.instrument import instrumented
+from utils.lazy_import import lazy_import
+from utils.plot_essentials import save_figure
+from utils.render_queue import figure_spec
 
+pg = lazy_import('pingouin')
+stats = lazy_import('scipy.stats')
+smf = lazy_import('statsmodels.formula.api')
+
+@instrumented
 def compute_repeated_measures(df_long, measure, parametric=False):
     friedman = pg.friedman(
         data=df_long,
@@ -25,7 +32,7 @@ def compute_repeated_measures(df_long, measure, parametric=False):
         parametric=parametric
     )
 
-    group_stats = df_long.groupby('condition')[measure].agg(['mean', 'std']).reset_index()
+    group_stats = df_long.groupby('condition', observed=True)[measure].agg(['mean', 'std']).reset_index()
 
     return {
         'stat_analysis': friedman,
@@ -34,63 +41,257 @@ def compute_repeated_measures(df_long, measure, parametric=False):
         'group_stats': group_stats
     }
 
-def learning_curve(df_long, measure):
-    df_long['condition'] = df_long['condition'].astype(str).astype('category')
-    df_long['condition'] = df_long['condition'].cat.reorder_categories(
-        ['0', '1', '2'], ordered=True
-    )
-    df_long['trialID'] = df_long['trialID'].astype(str).astype('category')
-    df_long['trialID'] = df_long['trialID'].cat.set_categories(['1', '2', '3'], ordered=True)
+@instrumented
+def pivot_measures(df_long, measures):
+    # Long table -> participants x conditions x measures array (one pivot for all measures)
+    df_wide = df_long.pivot_table(index='participantID', columns='condition', values=list(measures), observed=True)
+    conditions = [str(c) for c in df_wide.columns.levels[1] if (measures[0], c) in df_wide.columns]
+    X = np.stack([df_wide[measure].to_numpy(dtype=np.float64) for measure in measures], axis=2)
+    return X, conditions, list(df_wide.index)
+
+@instrumented
+def repeated_measures_tables(X, conditions, measures):
+    # X: participants x conditions x measures; the fast_stats engine takes measures as the batch axis
+    k = len(conditions)
+    Xb = np.moveaxis(X, 2, 0)
+    W, Q, p_friedman = fast_stats.friedman(Xb)
+    pairs, w_vals, p_unc, p_corr, hedges = fast_stats.pairwise_wilcoxon(Xb)
+
+    tables = {}
+    for m, measure in enumerate(measures):
+        friedman = pd.DataFrame(
+            {'Source': 'condition', 'W': W[m], 'ddof1': k - 1, 'Q': Q[m], 'p-unc': p_friedman[m]},
+            index=['Friedman']
+        )
+        pairwise = pd.DataFrame({
+            'Contrast': 'condition',
+            'A': [conditions[a] for a, _ in pairs],
+            'B': [conditions[b] for _, b in pairs],
+            'Paired': True,
+            'Parametric': False,
+            'W-val': w_vals[m],
+            'alternative': 'two-sided',
+            'p-unc': p_unc[m],
+            'p-corr': p_corr[m],
+            'p-adjust': 'holm' if len(pairs) > 1 else None,
+            'hedges': hedges[m]
+        })
+        tables[measure] = (friedman, pairwise)
+    return tables
+
+@instrumented
+def add_resampling_columns(tables, X, conditions, measures, resamples, seeds, workers=None, ci=0.95):
+    # X: participants x conditions x measures (complete cases); adds permutation p-values and
+    # bootstrap CIs. seeds: independent (permutation, bootstrap) seeds from resampling_seeds()
+    Xb = np.moveaxis(X, 2, 0)
+    p_friedman, p_pairwise, _ = resampling.permutation_test(Xb, resamples, seed=seeds[0], workers=workers)
+    hedges_ci = resampling.bootstrap_ci(Xb, resamples, seed=seeds[1], workers=workers, ci=ci)
+    for m, measure in enumerate(measures):
+        friedman, pairwise = tables[measure]
+        friedman['p-perm'] = p_friedman[m]
+        pairwise['p-perm'] = p_pairwise[m]
+        pairwise['p-perm-corr'] = fast_stats.holm(p_pairwise[m]) if len(pairwise) > 1 else np.nan
+        pairwise['hedges-ci-low'] = hedges_ci[m, :, 0]
+        pairwise['hedges-ci-high'] = hedges_ci[m, :, 1]
+
+@instrumented
+def compute_repeated_measures_batch(df_long, measures, parametric=False, resamples=0, seed=None, workers=None, ci=0.95):
+    # Same output as compute_repeated_measures for each measure, computed from a single pivot.
+    # With resamples > 0, permutation p-values and bootstrap CIs are added as extra columns
+    measures = list(measures)
+    if parametric:
+        return {measure: compute_repeated_measures(df_long, measure, parametric=True) for measure in measures}
+
+    X, conditions, _ = pivot_measures(df_long, measures)
+    # Listwise deletion is per measure; measures sharing a missing-data pattern are computed together
+    complete = ~np.isnan(X).any(axis=1)
+    seeds = resampling.resampling_seeds(seed, 3) if resamples else None
+    tables = {}
+    for mask in np.unique(complete.T, axis=0):
+        members = [m for m in range(len(measures)) if (complete[:, m] == mask).all()]
+        group_X = X[mask][:, :, members]
+        group_measures = [measures[m] for m in members]
+        group_tables = repeated_measures_tables(group_X, conditions, group_measures)
+        if resamples:
+            add_resampling_columns(group_tables, group_X, conditions, group_measures, resamples, seeds[:2], workers=workers, ci=ci)
+        tables.update(group_tables)
+    if resamples:
+        # The means below use every row, so their CIs resample all participants, not only complete cases
+        mean_ci = resampling.bootstrap_mean_ci(np.moveaxis(X, 2, 0), resamples, seed=seeds[2], workers=workers, ci=ci)
+
+    group_stats = df_long.groupby('condition', observed=True)[measures].agg(['mean', 'std'])
+    results = {}
+    for m, measure in enumerate(measures):
+        friedman, pairwise = tables[measure]
+        measure_stats = group_stats[measure].reset_index()
+        if resamples:
+            bounds = [dict(zip(conditions, mean_ci[m])).get(str(c), (np.nan, np.nan)) for c in measure_stats['condition']]
+            measure_stats['mean-ci-low'] = [low for low, _ in bounds]
+            measure_stats['mean-ci-high'] = [high for _, high in bounds]
+        results[measure] = {
+            'stat_analysis': friedman,
+            'results': pairwise,
+            'test': 'friedman + non-parametric pairwise',
+            'group_stats': measure_stats
+        }
+    return results
+
+@instrumented
+def learning_curve_frame(df_long, measure):
+    # Model columns taken as-is from the ingest schema; only categories absent from this subset are dropped
+    frame = df_long[['participantID', 'condition', 'trialID', measure]]
+    # Rows missing the measure or a trial number are left out of the model
+    if frame.isna().any(axis=None):
+        frame = frame.dropna()
+    for col in ['condition', 'trialID']:
+        if frame[col].nunique() < len(frame[col].cat.categories):
+            frame = frame.assign(**{col: frame[col].cat.remove_unused_categories()})
+    # The optimiser is sensitive to row order, so rows are put in a canonical order and the
+    # fit does not depend on how the logs were read (directory order, packed file, watch mode)
+    return frame.sort_values(['participantID', 'condition', 'trialID', measure], kind='stable', ignore_index=True)
+
+@instrumented
+def mixedlm_table(results, alpha=0.05):
+    # Numeric equivalent of results.summary().tables[1], built from the results object
+    k_fe = results.k_fe
+    table = np.full((len(results.params), 6), np.nan)
+    table[:k_fe, 0] = results.fe_params
+    table[:k_fe, 1] = np.sqrt(np.diag(np.asarray(results.cov_params()))[:k_fe])
+    table[:k_fe, 2] = table[:k_fe, 0] / table[:k_fe, 1]
+    table[:k_fe, 3] = 2 * stats.norm.cdf(-np.abs(table[:k_fe, 2]))
+    qm = -stats.norm.ppf(alpha / 2)
+    table[:k_fe, 4] = table[:k_fe, 0] - qm * table[:k_fe, 1]
+    table[:k_fe, 5] = table[:k_fe, 0] + qm * table[:k_fe, 1]
+    # Random effects (co)variances and variance components
+    bse = np.asarray(results.bse)
+    re_cov = [results.cov_re.iloc[i, j] for i in range(results.k_re) for j in range(i + 1)]
+    for jj, value in enumerate(re_cov + list(results.vcomp), start=k_fe):
+        table[jj, 0] = value
+        table[jj, 1] = np.sqrt(results.scale) * bse[jj]
+    df = pd.DataFrame(table, index=results.params.index, columns=['Coef.', 'Std.Err.', 'z', 'P>|z|', f'[{alpha / 2}', f'{1 - alpha / 2}]'])
+    df.index.name = 'variable'
+    return df.reset_index()
+
+def learning_curve_cache_path(data_dir, measure):
+    return os.path.join(cache_dir(data_dir), 'mixedlm', f'{measure}.pkl')
+
+@instrumented
+def fit_mixedlm(model, start_params=None):
+    if start_params is None:
+        return model.fit()
+    try:
+        warm = model.fit(start_params=start_params)
+    except (ValueError, np.linalg.LinAlgError) as e:
+        print(f"Warning: warm start failed ({e}), fitting from default starting values.")
+        return model.fit()
+    # A non-converged warm fit is discarded so results never depend on the cache history
+    return warm if warm.converged else model.fit()
 
-    model = smf.mixedlm(
+def learning_curve_model(frame, measure):
+    # Random intercept and trial slope per participant; frame from learning_curve_frame()
+    return smf.mixedlm(
         formula=f"{measure} ~ trialID * condition",
-        data=df_long,
-        groups=df_long["participantID"],
+        data=frame,
+        groups=frame["participantID"],
         re_formula="~trialID"
     )
 
-    results = model.fit()
+@instrumented
+def learning_curve(df_long, measure, data_dir=None, force=False):
+    # With data_dir, fits are cached in data/cache/mixedlm/: identical data, code and library
+    # versions reuse the table and anything else refits, warm-started from the previous
+    # parameter estimates. force ignores the cache and fits from the default start, as an
+    # uncached run would
+    frame = learning_curve_frame(df_long, measure)
+    formula = f"{measure} ~ trialID * condition"
+    cached, data_hash = None, None
+    if data_dir is not None:
+        data_hash = hash_object(formula, code_fingerprint(), frame)
+        cached = None if force else load_pickle(learning_curve_cache_path(data_dir, measure))
+        if cached is not None and cached['data_hash'] == data_hash:
+            return cached['table'].copy()
+
+    model = learning_curve_model(frame, measure)
+    start_params = cached['start_params'] if cached is not None and cached['formula'] == formula else None
+    results = fit_mixedlm(model, start_params)
+    table = mixedlm_table(results)
 
-    table_df = results.summary().tables[1]
-    
-    if not table_df.index.empty and table_df.index[0] != 0:
-        df = table_df.copy()
-        df.index.name = 'variable'
+    if data_dir is not None:
+        save_pickle(learning_curve_cache_path(data_dir, measure), {
+            'formula': formula,
+            'data_hash': data_hash,
+            'start_params': results.params_object.get_packed(use_sqrt=model.use_sqrt, has_fe=True),
+            'table': table
+        })
+    return table
+
+@instrumented
+def learning_curves(df_long, measures, data_dir=None, workers=None, force=False):
+    # Fits one mixed model per measure, in separate processes unless workers == 1
+    measures = list(measures)
+    columns = ['participantID', 'condition', 'trialID']
+    frames = [df_long[columns + [measure]] for measure in measures]
+    if workers == 1 or len(measures) == 1:
+        tables = [learning_curve(frame, measure, data_dir=data_dir, force=force) for frame, measure in zip(frames, measures)]
     else:
-        print("Warning: could not save LM results with variable names.")
-        return table_df
-    
-    # Convert numeric columns
-    numeric_cols = df.select_dtypes(include=['object']).columns
-    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='ignore')
-    return df.reset_index()
+        n = len(measures)
+        with worker_pool.process_pool(workers) as executor:
+            collected = list(executor.map(instrument.call_collected, [instrument.is_enabled()] * n, [learning_curve] * n, frames, measures, [data_dir] * n, [force] * n))
+        tables = [table for table, _ in collected]
+        for _, records in collected:
+            instrument.add_records(records)
+    return dict(zip(measures, tables))
 
-def generate_qq_plot_residuals(residuals, measure_name, data_dir=os.path.join(os.getcwd(), 'data')):
+def build_qq_template(values, title):
+    fig = figure_templates.new_figure((6, 6))
+    ax = fig.add_subplot()
+    stats.probplot(values, dist="norm", plot=ax)
+    ax.set_title(title)
+    template = {'fig': fig, 'ax': ax}
+    figure_templates.fit_layout(template)
+    return template
+
+def save_qq_plot(values, title, plot_dir, file_title, config):
+    # All QQ plots with the same config share one figure; only the points, fit line and title change
+    key = figure_templates.template_key('qq', config)
+    template, built = figure_templates.get_template(key, lambda: build_qq_template(values, title))
+    if not built:
+        ax = template['ax']
+        (osm, osr), (slope, intercept, _) = stats.probplot(values, dist="norm")
+        points, fit = ax.lines[:2]
+        points.set_data(osm, osr)
+        fit.set_data(osm, slope * osm + intercept)
+        ax.set_title(title)
+        figure_templates.rescale(ax)
+        figure_templates.fit_layout(template)
+    return save_figure(plot_dir, file_title, config, default_format='png', default_dpi=100, fig=template['fig'])
+
+@instrumented
+def generate_qq_plot_residuals(residuals, measure_name, data_dir=os.path.join(os.getcwd(), 'data'), config=qq_plot_config):
     plot_dir = os.path.join(data_dir, 'plots')
-    if plot_dir:
-        os.makedirs(plot_dir, exist_ok=True)
-    
-    fig = plt.figure(figsize=(6, 6))
-    stats.probplot(residuals, dist="norm", plot=plt)
-    plt.title(f"QQ Plot for residuals of {measure_name}")
-    plt.tight_layout()
-    
-    plot_path = os.path.join(plot_dir, f"qqplot_residuals_{measure_name}.png")
-    plt.savefig(plot_path)
-    plt.close(fig)
-    
-    return plot_path
-
-def check_normality_residuals(df_long, measure, alpha=0.01, data_dir=os.path.join(os.getcwd(), 'data')):
-    model = ols(f'{measure} ~ C(condition) + C(participantID)', data=df_long).fit()
+    return save_qq_plot(residuals, f"QQ Plot for residuals of {measure_name}", plot_dir, f"qqplot_residuals_{measure_name}", config)
+
+@instrumented
+def generate_qq_plot_differences(diffs, col1, col2, measure, data_dir=os.path.join(os.getcwd(), 'data'), config=qq_plot_config):
+    plot_dir = os.path.join(data_dir, 'plots')
+    label1 = condition_labels.get(col1, col1) if condition_labels else col1
+    label2 = condition_labels.get(col2, col2) if condition_labels else col2
+    return save_qq_plot(diffs, f"QQ Plot of {label1} - {label2} {measure}", plot_dir, f"qqplot_diff_{col1}_vs_{col2}_{measure}", config)
+
+@instrumented
+def check_normality_residuals(df_long, measure, alpha=0.01, data_dir=os.path.join(os.getcwd(), 'data'), figure_queue=None):
+    model = smf.ols(f'{measure} ~ C(condition) + C(participantID)', data=df_long).fit()
     residuals = model.resid
-    qq_plot_path = generate_qq_plot_residuals(residuals, measure, data_dir=data_dir)
+    # Plots are either rendered now or queued for utils.render_queue
+    if figure_queue is None:
+        generate_qq_plot_residuals(residuals, measure, data_dir=data_dir)
+    else:
+        figure_queue.append(figure_spec(generate_qq_plot_residuals, residuals, measure, data_dir=data_dir))
     normality = pg.normality(residuals, method='shapiro', alpha=alpha)
     return normality
 
-def check_normality_condition(df_long, measure, alpha=0.01, pairs = [(0, 1), (0, 2), (1, 2)], data_dir=os.path.join(os.getcwd(), 'data')):
-    plot_dir = os.path.join(data_dir, 'plots')
-    os.makedirs(plot_dir, exist_ok=True)
+@instrumented
+def check_normality_condition(df_long, measure, alpha=0.01, pairs = [(0, 1), (0, 2), (1, 2)], data_dir=os.path.join(os.getcwd(), 'data'), figure_queue=None):
     norm_results = []
 
     df_wide = df_long.pivot(index='participantID', columns='condition', values=measure)
@@ -108,53 +309,15 @@ def check_normality_condition(df_long, measure, alpha=0.01, pairs = [(0, 1), (0,
         norm_test.insert(0, 'condition_pair', f"{cond1}-{cond2}")
         norm_results.append(norm_test)
 
-        label1 = condition_labels.get(col1, col1) if condition_labels else col1
-        label2 = condition_labels.get(col2, col2) if condition_labels else col2
-        fig = plt.figure(figsize=(6, 6))
-        stats.probplot(diffs, dist="norm", plot=plt)
-        plt.title(f"QQ Plot of {label1} - {label2} {measure}")
-        plt.tight_layout()
-        plot_path = os.path.join(plot_dir, f"qqplot_diff_{col1}_vs_{col2}_{measure}.png")
-        plt.savefig(plot_path)
-        plt.close(fig)
+        if figure_queue is None:
+            generate_qq_plot_differences(diffs, col1, col2, measure, data_dir=data_dir)
+        else:
+            figure_queue.append(figure_spec(generate_qq_plot_differences, diffs, col1, col2, measure, data_dir=data_dir))
 
     norm_results_df = pd.concat(norm_results, ignore_index=True)
     return norm_results_df
 
+@instrumented
 def save_results_to_excel(results_dict, data_dir=os.path.join(os.getcwd(), 'data')):
-    results_dir = os.path.join(data_dir, 'results')
-    os.makedirs(results_dir, exist_ok=True)
-    save_path = os.path.join(results_dir, "results_summary.xlsx")
-    with pd.ExcelWriter(save_path, mode='w') as writer:
-        metadata = []
-        for label, result in results_dict.items():
-            # Save main test (Friedman)
-            if 'stat_analysis' in result and isinstance(result['stat_analysis'], pd.DataFrame):
-                result['stat_analysis'].to_excel(writer, sheet_name=f"{label}_friedman", index=False)
-                metadata.append({'Label': label, 'Test': 'Friedman', 'Sheet': f"{label}_friedman"})
-            # Save pairwise tests
-            if 'results' in result and isinstance(result['results'], pd.DataFrame):
-                result['results'].to_excel(writer, sheet_name=f"{label}_pairwise", index=False)
-                metadata.append({'Label': label, 'Test': 'Pairwise', 'Sheet': f"{label}_pairwise"})
-            # Save learning curve results
-            if 'learning_curve' in result and isinstance(result['learning_curve'], pd.DataFrame):
-                result['learning_curve'].to_excel(writer, sheet_name=f"{label}_learning_curve", index=False)
-                metadata.append({'Label': label, 'Test': 'Learning Curve', 'Sheet': f"{label}_learning_curve"})
-            # Save group stats
-            if 'group_stats' in result and isinstance(result['group_stats'], pd.DataFrame):
-                result['group_stats'].to_excel(writer, sheet_name=f"{label}_group_stats", index=False)
-                metadata.append({'Label': label, 'Test': 'Group Stats', 'Sheet': f"{label}_group_stats"})
-            # Save normality results
-            if 'normality_res' in result and isinstance(result['normality_res'], pd.DataFrame):
-                result['normality_res'] = result['normality_res'].reset_index()
-                result['normality_res'].to_excel(writer, sheet_name=f"{label}_normality_residuals", index=False)
-                metadata.append({'Label': label, 'Test': 'Normality of residuals', 'Sheet': f"{label}_normality_residuals"})
-            if 'normality_cond' in result and isinstance(result['normality_cond'], pd.DataFrame):
-                result['normality_cond'] = result['normality_cond'].reset_index()
-                result['normality_cond'].to_excel(writer, sheet_name=f"{label}_normality_condition", index=False)
-                metadata.append({'Label': label, 'Test': 'Normality of condition', 'Sheet': f"{label}_normality_condition"})
-        # Save metadata
-        if metadata:
-            pd.DataFrame(metadata).to_excel(writer, sheet_name="Metadata", index=False)
-        else:
-            pd.DataFrame({'Message': ['No results available']}).to_excel(writer, sheet_name="Empty", index=False)
+    # Other output formats are available through utils.results_sink.save_results
+    return results_sink.save_results(results_dict, data_dir=data_dir, sink='xlsx')
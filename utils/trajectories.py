@@ -0,0 +1,112 @@
+import os
+import numpy as np
+import pandas as pd
+from cfg.data_config import trajectory_config, measure_dtype
+from utils.cache_utils import cache_dir, hash_object, load_pickle, save_pickle
+from utils.log_decoder import decode_document
+from utils.instrument import instrumented
+from utils import worker_pool
+
+# Per-log aggregates of the sample arrays stored in the JSON logs (see trajectory_config in
+# cfg/data_config.py). Each log's samples are turned into NumPy arrays one chunk at a time
+# and every aggregate is accumulated across chunks, so the float arrays never exceed one
+# chunk; only the path error of each sample (8 bytes, needed for exact percentiles) is
+# kept for the whole log. The log itself is still decoded in one piece, so peak memory per
+# worker grows with the longest recording (about 0.75 kB per sample with msgspec, several
+# times the file size). Logs are processed one per worker and reduced to a handful of
+# numbers, so memory does not grow with the number of logs.
+
+def trajectory_measures(config=trajectory_config):
+    return ['traj_mse', 'traj_rmse', 'traj_jerk'] + [f"traj_p{p:g}" for p in config['percentiles']]
+
+def sample_count(samples, fields):
+    return len(samples[fields[0]]) if isinstance(samples, dict) else len(samples)
+
+def sample_chunk(samples, fields, start, stop):
+    # (stop - start) x len(fields) array from a list of samples or a dict of arrays
+    if isinstance(samples, dict):
+        return np.column_stack([np.asarray(samples[field][start:stop], dtype=np.float64) for field in fields])
+    return np.array([[sample[field] for field in fields] for sample in samples[start:stop]], dtype=np.float64)
+
+def jerk_magnitudes(t, pos):
+    # |d^3 pos / dt^3| from successive finite differences; steps with dt <= 0 are dropped
+    with np.errstate(divide='ignore', invalid='ignore'):
+        v = np.diff(pos, axis=0) / np.diff(t)[:, None]
+        tv = (t[1:] + t[:-1]) / 2
+        a = np.diff(v, axis=0) / np.diff(tv)[:, None]
+        ta = (tv[1:] + tv[:-1]) / 2
+        j = np.diff(a, axis=0) / np.diff(ta)[:, None]
+    magnitudes = np.linalg.norm(j, axis=1)
+    return magnitudes[np.isfinite(magnitudes)]
+
+def log_aggregates(document, config=trajectory_config):
+    # Returns the values of trajectory_measures(config), NaN where they cannot be computed
+    samples = document[config['key']]
+    dims = len(config['position'])
+    fields = [config['time'], *config['position'], *config['reference']]
+    n = sample_count(samples, fields)
+    errors = np.empty(n) if config['reference'] else None
+    jerk_sum, jerk_count = 0.0, 0
+    # The last three samples of a chunk are carried over so jerk spans chunk boundaries
+    carry = None
+    for start in range(0, n, config['chunk_samples']):
+        block = sample_chunk(samples, fields, start, min(start + config['chunk_samples'], n))
+        if errors is not None:
+            errors[start:start + len(block)] = np.linalg.norm(block[:, 1:1 + dims] - block[:, 1 + dims:], axis=1)
+        motion = block[:, :1 + dims] if carry is None else np.vstack([carry, block[:, :1 + dims]])
+        jerk = jerk_magnitudes(motion[:, 0], motion[:, 1:])
+        jerk_sum += jerk.sum()
+        jerk_count += len(jerk)
+        carry = motion[-3:]
+
+    nan = float('nan')
+    if errors is not None and n:
+        mse = float(np.mean(np.square(errors)))
+        percentiles = [float(v) for v in np.percentile(errors, config['percentiles'])]
+    else:
+        mse, percentiles = nan, [nan] * len(config['percentiles'])
+    jerk_mean = float(jerk_sum / jerk_count) if jerk_count else nan
+    return (mse, float(np.sqrt(mse)), jerk_mean, *percentiles)
+
+def file_aggregates(job):
+    fpath, config = job
+    try:
+        with open(fpath, 'rb') as f:
+            document = decode_document(f.read())
+        return log_aggregates(document, config)
+    except Exception:
+        # Unreadable logs and logs without (complete) sample arrays
+        return None
+
+def trajectory_cache_path(data_dir):
+    return os.path.join(cache_dir(data_dir), 'trajectory_cache.pkl')
+
+@instrumented
+def add_trajectory_measures(data_dir, df_long, fnames, workers=None, use_cache=True, config=trajectory_config):
+    # fnames: the log behind each row of df_long, in row order. Aggregates are cached per
+    # file (size, mtime) together with a hash of config
+    json_dir = os.path.join(data_dir, 'json_logs')
+    config_hash = hash_object(config)
+    cached = load_pickle(trajectory_cache_path(data_dir)) if use_cache else None
+    files = cached['files'] if cached is not None and cached['config'] == config_hash else {}
+
+    stats = {fname: os.stat(os.path.join(json_dir, fname)) for fname in dict.fromkeys(fnames)}
+    stale = [fname for fname, st in stats.items() if files.get(fname, (None, None))[:2] != (st.st_size, st.st_mtime_ns)]
+    jobs = [(os.path.join(json_dir, fname), config) for fname in stale]
+    if workers == 1 or len(jobs) < 2:
+        values = list(map(file_aggregates, jobs))
+    else:
+        with worker_pool.process_pool(workers) as executor:
+            values = list(executor.map(file_aggregates, jobs, chunksize=8))
+    for fname, value in zip(stale, values):
+        files[fname] = (stats[fname].st_size, stats[fname].st_mtime_ns, value)
+    if use_cache and stale:
+        save_pickle(trajectory_cache_path(data_dir), {'config': config_hash, 'files': {f: files[f] for f in stats}})
+
+    measures = trajectory_measures(config)
+    missing = sorted(fname for fname in stats if files[fname][2] is None)
+    if missing:
+        print(f"Warning: no usable '{config['key']}' samples in {len(missing)} log files, e.g. {missing[:3]}")
+    rows = [files[fname][2] or (float('nan'),) * len(measures) for fname in fnames]
+    table = np.array(rows, dtype=np.float64).reshape(len(rows), len(measures))
+    return df_long.assign(**{measure: pd.Series(table[:, i], dtype=measure_dtype, index=df_long.index) for i, measure in enumerate(measures)})
@@ -0,0 +1,42 @@
+import os
+import time
+from utils.parse_core import iter_log_entries, order_path
+
+# Polling watcher for data_analysis.py --watch. A snapshot maps every JSON log (and
+# other/order.xlsx) to its size and modification time; polling a directory listing
+# is cheap compared to a rerun and needs no platform-specific notification API.
+
+def snapshot(data_dir):
+    files = {}
+    json_dir = os.path.join(data_dir, 'json_logs')
+    if os.path.isdir(json_dir):
+        for entry in iter_log_entries(json_dir):
+            st = entry.stat()
+            files[entry.name] = (st.st_size, st.st_mtime_ns)
+    if os.path.exists(order_path(data_dir)):
+        st = os.stat(order_path(data_dir))
+        files['order.xlsx'] = (st.st_size, st.st_mtime_ns)
+    return files
+
+def describe_changes(previous, current):
+    added = sorted(set(current) - set(previous))
+    removed = sorted(set(previous) - set(current))
+    modified = sorted(name for name in set(current) & set(previous) if current[name] != previous[name])
+    return {'added': added, 'modified': modified, 'removed': removed}
+
+def wait_for_changes(data_dir, previous, interval=2.0, debounce=5.0):
+    # Blocks until the snapshot differs from previous and has then stayed the same for
+    # debounce seconds, so a burst of copied files (or a file still being written)
+    # triggers one update. Returns the settled snapshot.
+    current = previous
+    while current == previous:
+        time.sleep(interval)
+        current = snapshot(data_dir)
+    settled_since = time.monotonic()
+    while True:
+        time.sleep(min(interval, debounce))
+        latest = snapshot(data_dir)
+        if latest != current:
+            current, settled_since = latest, time.monotonic()
+        elif time.monotonic() - settled_since >= debounce:
+            return current
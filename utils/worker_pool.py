@@ -0,0 +1,42 @@
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+# Process pool used by the parallel steps (log parsing, resampling, mixed models,
+# trajectories, figure rendering). Normally each step starts its own pool and shuts it
+# down when done. Inside shared_pool() they all submit to one long-lived pool instead,
+# so several analyses run in one interpreter (src/batch_analysis.py) do not pay the
+# worker start-up and import cost again for every step of every data directory.
+# Pools are started by a fork server rather than by forking the caller: the steps run in
+# pipeline threads, and forking a process with running threads can deadlock the children.
+
+POOL = {'executor': None}
+
+def new_executor(workers=None):
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+
+def is_shared():
+    return POOL['executor'] is not None
+
+@contextmanager
+def shared_pool(workers=None):
+    if is_shared():
+        yield POOL['executor']
+        return
+    executor = new_executor(workers)
+    POOL['executor'] = executor
+    try:
+        yield executor
+    finally:
+        POOL['executor'] = None
+        executor.shutdown(cancel_futures=True)
+
+@contextmanager
+def process_pool(workers=None):
+    # The shared pool if one is open (it is left running), otherwise a pool for this call only
+    if is_shared():
+        yield POOL['executor']
+        return
+    with new_executor(workers) as executor:
+        yield executor